@@ -1,7 +1,11 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.http import FileResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
 from django.utils.html import format_html
 
+from api.models import RequestProfile
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
 from users.models import User
@@ -17,8 +21,8 @@ class UserAdmin(UserAdmin):
         'first_name',
         'last_name',
         'email',
-        'get_followers_count',
-        'get_recipes_count',
+        'followers_count',
+        'recipes_count',
     )
     search_fields = (
         'username',
@@ -29,14 +33,6 @@ class UserAdmin(UserAdmin):
         'email',
     )
 
-    @admin.display(description='Количество подписчиков')
-    def get_followers_count(self, obj):
-        return obj.follower.count()
-
-    @admin.display(description='Количество рецептов')
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
 
 class IngredientInline(admin.TabularInline):
 
@@ -54,7 +50,7 @@ class RecipeAdmin(admin.ModelAdmin):
         'id',
         'name',
         'author',
-        'favorite_count',
+        'favorites_count',
         'ingredients_list',
         'tags_list',
     )
@@ -66,10 +62,6 @@ class RecipeAdmin(admin.ModelAdmin):
         'tags',
     )
 
-    @admin.display(description='Добавлено в избранное')
-    def favorite_count(self, obj):
-        return obj.favorites.count()
-
     @admin.display(description='Список ингредиентов')
     def ingredients_list(self, obj):
         return ', '.join(obj.ingredients.values_list('name', flat=True))
@@ -156,3 +148,57 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     search_fields = (
         'user',
     )
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+
+    list_display = (
+        'created',
+        'view',
+        'path',
+        'user',
+        'duration_ms',
+        'profiler',
+        'download',
+    )
+    search_fields = (
+        'view',
+        'path',
+    )
+    list_filter = (
+        'view',
+        'profiler',
+    )
+    readonly_fields = list_display
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:pk>/download/',
+                self.admin_site.admin_view(self.download_view),
+                name='api_requestprofile_download',
+            ),
+        ] + super().get_urls()
+
+    def download_view(self, request, pk):
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        return FileResponse(
+            profile.file.open('rb'),
+            as_attachment=True,
+            filename=profile.file.name,
+        )
+
+    @admin.display(description='Файл профиля')
+    def download(self, obj):
+        return format_html(
+            '<a href="{}">{}</a>',
+            reverse('admin:api_requestprofile_download', args=(obj.pk,)),
+            obj.file.name,
+        )
@@ -0,0 +1,191 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.paginator import InvalidPage
+from django.db import close_old_connections, connections
+from django.utils.translation import gettext as _
+from rest_framework.exceptions import NotFound
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+
+from api.cache import get_response_key
+from api.profiling import wants_profile
+from recipes.models import Recipe
+
+# Потоки пула, уже проверившие свои соединения в текущем запросе.
+checked_threads = contextvars.ContextVar('checked_threads', default=None)
+
+
+def init_worker():
+    # Соединения потока пула живут ASYNC_DB_CONN_MAX_AGE секунд. Настройка
+    # меняется только у соединений этого потока, потоки запросов
+    # по-прежнему закрывают соединения по общему CONN_MAX_AGE.
+    for alias in connections:
+        connection = connections[alias]
+        connection.settings_dict = {
+            **connection.settings_dict,
+            'CONN_MAX_AGE': settings.ASYNC_DB_CONN_MAX_AGE,
+        }
+
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_DB_WORKERS,
+    thread_name_prefix='async-db',
+    initializer=init_worker,
+)
+
+
+def run_query(function, *args):
+    # Как request_started у синхронных представлений: устаревшие и
+    # сломанные соединения потока закрываются один раз за запрос, перед
+    # первым запросом к базе в этом потоке.
+    threads = checked_threads.get()
+    thread = threading.get_ident()
+    if threads is not None and thread not in threads:
+        threads.add(thread)
+        close_old_connections()
+    return function(*args)
+
+
+async def run(function, *args):
+    """Выполняет синхронную функцию с ORM в пуле потоков базы."""
+
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, context.run, run_query, function, *args
+    )
+
+
+async def gather(*calls):
+    """Выполняет независимые запросы к базе одновременно."""
+
+    return await asyncio.gather(*(run(*call) for call in calls))
+
+
+async def run_action(view, request, **kwargs):
+    """Выполняет действие viewset целиком в пуле потоков."""
+
+    return await run(partial(getattr(view, view.action), request, **kwargs))
+
+
+async def paginate_recipes(paginator, queryset, request, view):
+    """Страница рецептов, число рецептов считается одновременно со страницей.
+
+    Последняя страница и постраничный вывод по курсору зависят от
+    результата первого запроса и выполняются обычным пагинатором.
+    """
+
+    number = request.query_params.get(paginator.page_query_param, 1)
+    if (
+        paginator.cursor_query_param in request.query_params
+        or number in paginator.last_page_strings
+    ):
+        return await run(paginator.paginate_queryset, queryset, request, view)
+    paginator.cursor_mode = False
+    try:
+        number = int(number)
+    except (TypeError, ValueError):
+        message = _('That page number is not an integer')
+    else:
+        message = _('That page number is less than 1') if number < 1 else None
+    if message is not None:
+        raise NotFound(paginator.invalid_page_message.format(
+            page_number=number, message=message
+        ))
+    page_size = paginator.get_page_size(request)
+    django_paginator = paginator.django_paginator_class(queryset, page_size)
+    offset = (number - 1) * page_size
+    recipes = (await gather(
+        (lambda: django_paginator.count,),
+        (list, queryset[offset:offset + page_size]),
+    ))[1]
+    try:
+        paginator.page = django_paginator.page(number)
+    except InvalidPage as exc:
+        raise NotFound(paginator.invalid_page_message.format(
+            page_number=number, message=str(exc)
+        ))
+    paginator.page.object_list = recipes
+    paginator.request = request
+    if django_paginator.num_pages > 1 and paginator.template is not None:
+        paginator.display_page_controls = True
+    return recipes
+
+
+async def load_recipes(view, request, **kwargs):
+    queryset = await run(
+        view.filter_queryset, Recipe.objects.for_read(request.user)
+    )
+    recipes = await paginate_recipes(view.paginator, queryset, request, view)
+    data = await run(lambda: view.get_serializer(recipes, many=True).data)
+    return view.get_paginated_response(data)
+
+
+async def load_recipe(view, request, **kwargs):
+    queryset = await run(
+        view.filter_queryset, Recipe.objects.for_read(request.user)
+    )
+    recipe = await run(partial(
+        get_object_or_404, queryset, **{view.lookup_field: kwargs['id']}
+    ))
+    view.check_object_permissions(request, recipe)
+    data = await run(lambda: view.get_serializer(recipe).data)
+    return Response(data)
+
+
+async def cache_response(load, view, request, **kwargs):
+    """Ответ load с кэшированием, как у ResponseCacheMixin."""
+
+    if not view.is_response_cacheable(request):
+        return await load(view, request, **kwargs)
+    key = await run(
+        get_response_key, request, request.accepted_renderer.format
+    )
+    response = await run(view.read_cached_response, key)
+    if response is None:
+        response = await load(view, request, **kwargs)
+        await run(view.write_cached_response, key, response)
+    return response
+
+
+def as_async_view(viewset, actions, load):
+    """Асинхронное представление GET поверх viewset.
+
+    Проверки доступа, фильтры, пагинация и сериализаторы берутся из
+    viewset, запрос к базе выполняет load. Остальные методы, как и
+    запросы с профилированием, обрабатывает синхронное представление.
+    """
+
+    sync_view = sync_to_async(viewset.as_view(actions))
+
+    async def view(request, *args, **kwargs):
+        if request.method != 'GET' or wants_profile(request):
+            return await sync_view(request, *args, **kwargs)
+        checked_threads.set(set())
+        instance = viewset(action_map=actions)
+        for method, action in actions.items():
+            setattr(instance, method, getattr(instance, action))
+        instance.args = args
+        instance.kwargs = kwargs
+        instance.request = request
+        instance.headers = instance.default_response_headers
+        request = instance.initialize_request(request, *args, **kwargs)
+        instance.request = request
+        try:
+            await run(partial(instance.initial, request, *args, **kwargs))
+            response = await load(instance, request, **kwargs)
+        except Exception as exc:
+            response = instance.handle_exception(exc)
+        return instance.finalize_response(request, response, *args, **kwargs)
+
+    # csrf_exempt в Django 3.2 оборачивает представление синхронной
+    # функцией, поэтому флаг ставится напрямую.
+    view.csrf_exempt = True
+    view.cls = viewset
+    view.actions = actions
+    return view
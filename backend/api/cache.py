@@ -0,0 +1,117 @@
+import hashlib
+import threading
+from collections import Counter
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache, caches
+
+from recipes.models import Tag
+
+CART_VERSION_KEY = 'shopping-cart-version:{user_id}'
+CART_ROWS_KEY = 'shopping-cart-rows:{user_id}:{version}'
+TAG_SLUGS_KEY = 'tag-slugs'
+CONTENT_GENERATION_KEY = 'content-generation'
+RESPONSE_KEY = 'api-response:{generation}:{digest}'
+
+response_cache_stats = Counter()
+response_cache_stats_lock = threading.Lock()
+
+
+def get_cart_version(user_id):
+    """Возвращает текущую версию корзины пользователя."""
+
+    key = CART_VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_cart_versions(user_ids):
+    """Сбрасывает версии корзин, старые списки покупок больше не читаются."""
+
+    cache.delete_many(
+        [CART_VERSION_KEY.format(user_id=user_id) for user_id in user_ids]
+    )
+
+
+def get_cart_rows(user_id, version):
+    return cache.get(CART_ROWS_KEY.format(user_id=user_id, version=version))
+
+
+def cache_cart_rows(rows, user_id, version):
+    """Отдает строки списка покупок и сохраняет их в кэш по окончании.
+
+    Слишком длинные списки не кэшируются, чтобы не держать их в памяти.
+    """
+
+    collected = []
+    for row in rows:
+        if collected is not None:
+            collected.append(row)
+            if len(collected) > settings.SHOPPING_CART_CACHE_MAX_ROWS:
+                collected = None
+        yield row
+    if collected is not None:
+        cache.set(
+            CART_ROWS_KEY.format(user_id=user_id, version=version),
+            collected,
+            settings.SHOPPING_CART_CACHE_TIMEOUT,
+        )
+
+
+def get_tag_slugs():
+    """Возвращает словарь slug -> id всех тегов."""
+
+    slugs = cache.get(TAG_SLUGS_KEY)
+    if slugs is None:
+        slugs = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(TAG_SLUGS_KEY, slugs, None)
+    return slugs
+
+
+def invalidate_tag_slugs():
+    cache.delete(TAG_SLUGS_KEY)
+
+
+def get_response_cache():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def get_content_generation():
+    """Возвращает поколение данных, на которых построены ответы API."""
+
+    response_cache = get_response_cache()
+    generation = response_cache.get(CONTENT_GENERATION_KEY)
+    if generation is None:
+        response_cache.add(CONTENT_GENERATION_KEY, uuid4().hex, None)
+        generation = response_cache.get(CONTENT_GENERATION_KEY)
+    return generation
+
+
+def bump_content_generation():
+    """Делает недействительными все закэшированные ответы API."""
+
+    get_response_cache().set(CONTENT_GENERATION_KEY, uuid4().hex, None)
+
+
+def get_response_key(request, format):
+    params = sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+    )
+    # Ответы содержат абсолютные ссылки, поэтому схема и хост входят в ключ.
+    digest = hashlib.md5(repr((
+        request.scheme, request.get_host(), request.path, format, params
+    )).encode()).hexdigest()
+    return RESPONSE_KEY.format(
+        generation=get_content_generation(), digest=digest
+    )
+
+
+def count_response_cache(view_name, result):
+    with response_cache_stats_lock:
+        response_cache_stats[(view_name, result)] += 1
@@ -0,0 +1,57 @@
+import json
+
+from api.transactions import CommitBatch
+from recipes.models import Recipe, RecipeCard
+
+
+def get_card(recipe):
+    try:
+        return recipe.card
+    except RecipeCard.DoesNotExist:
+        return None
+
+
+def build_cards(recipe_ids, replace=True):
+    """Строит карточки рецептов и сохраняет их в RecipeCard.
+
+    При replace=False существующие карточки не перезаписываются: так
+    строятся недостающие карточки при чтении, чтобы не затереть более
+    новую карточку, построенную после изменения рецепта.
+    """
+
+    from api.serializers import RecipeCardSerializer
+
+    cards = {
+        recipe.pk: RecipeCard(
+            recipe=recipe,
+            data=json.dumps(
+                RecipeCardSerializer(recipe).data, ensure_ascii=False
+            ),
+        )
+        for recipe in Recipe.objects.for_card().filter(id__in=recipe_ids)
+    }
+    if replace:
+        RecipeCard.objects.bulk_update(cards.values(), ['data'])
+    RecipeCard.objects.bulk_create(cards.values(), ignore_conflicts=True)
+    return cards
+
+
+def attach_cards(recipes):
+    """Строит недостающие карточки рецептов и присоединяет их к рецептам."""
+
+    missing = [recipe for recipe in recipes if get_card(recipe) is None]
+    if not missing:
+        return {}
+    cards = build_cards([recipe.pk for recipe in missing], replace=False)
+    for recipe in missing:
+        recipe.card = cards[recipe.pk]
+    return cards
+
+
+# Все изменения одной транзакции перестраивают каждую карточку один раз,
+# уже по зафиксированным данным.
+card_rebuild = CommitBatch(build_cards)
+
+
+def rebuild_cards(recipe_ids):
+    card_rebuild.add(recipe_ids)
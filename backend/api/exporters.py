@@ -0,0 +1,121 @@
+import csv
+import json
+import tempfile
+
+from django.conf import settings
+from rest_framework import renderers
+
+PDF_FONT = 'ShoppingListFont'
+PDF_FONT_SIZE = 12
+PDF_LINE_HEIGHT = 18
+PDF_MARGIN = 50
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class ShoppingListRenderer(renderers.JSONRenderer):
+    """Рендерер, объявляющий формат списка покупок.
+
+    Сам список отдается потоком экспортером этого формата, рендерер
+    используется только для выбора формата и для ответов с ошибками.
+    """
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+
+
+def export_txt(rows):
+    for number, (name, unit, amount) in enumerate(rows, start=1):
+        separator = '\n' if number > 1 else ''
+        yield f'{separator}{number}. {name} {amount} {unit}'.encode()
+
+
+class Echo:
+    """Объект с интерфейсом файла, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def export_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Количество', 'Единица измерения'))
+    for name, unit, amount in rows:
+        yield writer.writerow((name, amount, unit))
+
+
+def export_json(rows):
+    yield b'['
+    for number, (name, unit, amount) in enumerate(rows):
+        separator = b',' if number else b''
+        yield separator + json.dumps(
+            {'name': name, 'measurement_unit': unit, 'amount': amount},
+            ensure_ascii=False,
+        ).encode()
+    yield b']'
+
+
+def export_pdf(rows):
+    """Рисует список в PDF во временный файл и отдает его частями.
+
+    Файл держится в памяти до SHOPPING_LIST_PDF_SPOOL_SIZE байт,
+    больший документ сбрасывается на диск.
+    """
+
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    if PDF_FONT not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(
+            TTFont(PDF_FONT, settings.SHOPPING_LIST_PDF_FONT)
+        )
+    with tempfile.SpooledTemporaryFile(
+        max_size=settings.SHOPPING_LIST_PDF_SPOOL_SIZE
+    ) as file:
+        document = canvas.Canvas(file, pagesize=A4)
+        _, height = A4
+        position = 0
+        for number, (name, unit, amount) in enumerate(rows, start=1):
+            if position < PDF_MARGIN + PDF_LINE_HEIGHT:
+                if number > 1:
+                    document.showPage()
+                document.setFont(PDF_FONT, PDF_FONT_SIZE)
+                position = height - PDF_MARGIN
+            document.drawString(
+                PDF_MARGIN, position, f'{number}. {name} {amount} {unit}'
+            )
+            position -= PDF_LINE_HEIGHT
+        document.save()
+        file.seek(0)
+        while chunk := file.read(STREAM_CHUNK_SIZE):
+            yield chunk
+
+
+EXPORTERS = {
+    'txt': export_txt,
+    'csv': export_csv,
+    'json': export_json,
+    'pdf': export_pdf,
+}
+
+SHOPPING_LIST_RENDERERS = (
+    TextShoppingListRenderer,
+    CSVShoppingListRenderer,
+    renderers.JSONRenderer,
+    PDFShoppingListRenderer,
+)
@@ -1,20 +1,79 @@
+from functools import lru_cache
+
 import django_filters
+from django.conf import settings
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            TrigramSimilarity)
+from django.db import connection
+from django.db.models import (Case, Exists, F, FloatField, IntegerField,
+                              OuterRef, Value, When)
 from rest_framework import filters
 
-from recipes.models import Recipe
+from api.cache import get_tag_slugs
+from api.indexes import recipe_search_index
+from api.search import uses_search_vector
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+
+@lru_cache(maxsize=None)
+def has_trigram_support():
+    """Проверяет, установлено ли в базе расширение pg_trgm."""
+
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
 
+class IngredientFilter(filters.BaseFilterBackend):
+    """Фильтр поиска ингредиента по имени.
 
-class IngredientFilter(filters.SearchFilter):
-    """Фильтр поиска ингредиента по имени."""
+    Сначала выдаются совпадения по началу названия, затем по подстроке.
+    В PostgreSQL с pg_trgm поиск идет по триграммному индексу,
+    иначе список ингредиентов подбирается по отсортированному индексу
+    названий в памяти процесса (IngredientsViewSet.list).
+    """
 
     search_param = 'name'
 
+    @classmethod
+    def get_term(cls, request):
+        return request.query_params.get(cls.search_param, '').strip()
+
+    @staticmethod
+    def searches_database():
+        mode = settings.INGREDIENT_SEARCH_MODE
+        return mode == 'database' or (
+            mode == 'auto' and has_trigram_support()
+        )
+
+    def filter_queryset(self, request, queryset, view):
+        term = self.get_term(request)
+        if not term:
+            return queryset
+        if not self.searches_database():
+            return queryset.filter(name__icontains=term)
+        queryset = queryset.filter(name__icontains=term).annotate(
+            is_substring=Case(
+                When(name__istartswith=term, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            ),
+        )
+        if has_trigram_support():
+            return queryset.annotate(
+                similarity=TrigramSimilarity('name', term)
+            ).order_by('is_substring', '-similarity', 'name')
+        return queryset.order_by('is_substring', 'name')
+
 
 class RecipeFilter(django_filters.FilterSet):
     """Фильтр поиска рецептов."""
 
-    tags = django_filters.AllValuesMultipleFilter(
-        field_name='tags__slug'
+    tags = django_filters.MultipleChoiceFilter(
+        choices=lambda: [(slug, slug) for slug in get_tag_slugs()],
+        method='filter_tags',
     )
     is_favorited = django_filters.NumberFilter(
         method='filter_is_favorited_or_in_cart'
@@ -22,6 +81,7 @@ class RecipeFilter(django_filters.FilterSet):
     is_in_shopping_cart = django_filters.NumberFilter(
         method='filter_is_favorited_or_in_cart'
     )
+    search = django_filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
@@ -30,16 +90,64 @@ class RecipeFilter(django_filters.FilterSet):
             'author',
             'is_favorited',
             'is_in_shopping_cart',
+            'search',
         )
 
+    def filter_tags(self, queryset, name, value):
+        """Рецепты хотя бы с одним из тегов, без JOIN и DISTINCT."""
+
+        slugs = get_tag_slugs()
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe_id=OuterRef('pk'),
+                tag_id__in=[slugs[slug] for slug in value],
+            )
+        ))
+
     def filter_is_favorited_or_in_cart(self, queryset, name, value):
-        filter_dict = {}
-        if name == 'is_favorited':
-            filter_dict = {'favorites__user': self.request.user}
-        elif name == 'is_in_shopping_cart':
-            filter_dict = {'carts__user': self.request.user}
+        """Рецепты из избранного или корзины пользователя.
 
-        if value and not self.request.user.is_anonymous:
-            queryset = queryset.filter(**filter_dict)
+        Подзапрос не зависит от аннотаций queryset, поэтому фильтр
+        работает и в запросах на изменение, где флагов нет.
+        """
 
+        if value and not self.request.user.is_anonymous:
+            model = {
+                'is_favorited': Favorite,
+                'is_in_shopping_cart': ShoppingCart,
+            }[name]
+            queryset = queryset.filter(Exists(model.objects.filter(
+                user=self.request.user, recipe=OuterRef('pk')
+            )))
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию, ингредиентам и описанию.
+
+        Рецепты упорядочиваются по рангу совпадения, затем по дате.
+        """
+
+        value = value.strip()
+        if not value:
+            return queryset
+        if uses_search_vector():
+            query = SearchQuery(value, config=settings.RECIPE_SEARCH_CONFIG)
+            queryset = queryset.filter(search_vector=query).annotate(
+                search_rank=SearchRank(F('search_vector'), query),
+            )
+        else:
+            ranks = recipe_search_index.search(value)
+            ids_by_rank = {}
+            for pk, rank in ranks.items():
+                ids_by_rank.setdefault(rank, []).append(pk)
+            queryset = queryset.filter(pk__in=ranks).annotate(
+                search_rank=Case(
+                    *(
+                        When(pk__in=ids, then=Value(rank))
+                        for rank, ids in ids_by_rank.items()
+                    ),
+                    default=Value(0.0),
+                    output_field=FloatField(),
+                ),
+            )
+        return queryset.order_by('-search_rank', *Recipe._meta.ordering)
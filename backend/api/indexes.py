@@ -0,0 +1,373 @@
+import heapq
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from uuid import uuid4
+
+from django.core.cache import cache
+
+from api.transactions import CommitBatch
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+
+WORD_RE = re.compile(r'\w+')
+
+# Веса полей рецепта совпадают с весами A, B и C ts_rank в PostgreSQL.
+RECIPE_FIELD_WEIGHTS = {
+    'name': 1.0,
+    'ingredients': 0.4,
+    'text': 0.2,
+}
+
+
+def tokenize(text):
+    return WORD_RE.findall(text.casefold().replace('ё', 'е'))
+
+
+class SharedGenerationIndex:
+    """Индекс в памяти процесса, согласованный через общий кэш.
+
+    При изменении данных в кэше меняется поколение индекса, и каждый
+    процесс перестраивает свою копию при следующем обращении.
+    """
+
+    generation_key = None
+
+    def __init__(self):
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def build(self):
+        raise NotImplementedError
+
+    def invalidate(self):
+        cache.set(self.generation_key, uuid4().hex, None)
+
+    def get_generation(self):
+        generation = cache.get(self.generation_key)
+        if generation is None:
+            cache.add(self.generation_key, uuid4().hex, None)
+            generation = cache.get(self.generation_key)
+        return generation
+
+    def ensure_fresh(self):
+        generation = self.get_generation()
+        if generation != self._generation:
+            with self._lock:
+                if generation != self._generation:
+                    self.build()
+                    self._generation = generation
+
+
+class IncrementalIndex(SharedGenerationIndex):
+    """Индекс в памяти, обновляемый по журналу изменений в общем кэше.
+
+    Каждое изменение получает в кэше номер версии и список измененных
+    ключей. Процесс, отставший на несколько версий, перестраивает только
+    эти ключи; если записи журнала вытеснены из кэша или их слишком много,
+    индекс строится заново.
+    """
+
+    version_key = None
+    changes_key = None
+    changes_timeout = 60 * 60
+    max_changes = 1000
+
+    def __init__(self):
+        super().__init__()
+        self._version = None
+        # Все изменения одной транзакции попадают в журнал одной записью.
+        self._changes = CommitBatch(self.record_changes)
+
+    def update(self, keys):
+        raise NotImplementedError
+
+    def get_version(self):
+        return cache.get(self.version_key, 0)
+
+    def change(self, keys):
+        """Отмечает ключи измененными после фиксации транзакции."""
+
+        self._changes.add(keys)
+
+    def record_changes(self, keys):
+        cache.add(self.version_key, 0, None)
+        try:
+            version = cache.incr(self.version_key)
+        except ValueError:
+            # Версия вытеснена из кэша между add и incr.
+            self.invalidate()
+            return
+        cache.set(
+            self.changes_key.format(version=version),
+            list(keys),
+            self.changes_timeout,
+        )
+
+    def ensure_fresh(self):
+        generation = self.get_generation()
+        version = self.get_version()
+        if generation == self._generation and version == self._version:
+            return
+        with self._lock:
+            if generation != self._generation or not self.apply_changes(
+                version
+            ):
+                self.build()
+                self._generation = generation
+            self._version = version
+
+    def apply_changes(self, version):
+        """Применяет записи журнала до version, False - нужна перестройка."""
+
+        if self._version is None or not (
+            self._version <= version <= self._version + self.max_changes
+        ):
+            return False
+        changes = cache.get_many([
+            self.changes_key.format(version=number)
+            for number in range(self._version + 1, version + 1)
+        ])
+        if len(changes) != version - self._version:
+            return False
+        if changes:
+            self.update(set().union(*changes.values()))
+        return True
+
+
+class IngredientPrefixIndex(SharedGenerationIndex):
+    """Отсортированный массив названий ингредиентов для автодополнения."""
+
+    generation_key = 'ingredient-index-generation'
+
+    def __init__(self):
+        super().__init__()
+        self._entries = ([], [])
+
+    def build(self):
+        entries = sorted(
+            (name.casefold(), pk)
+            for pk, name in Ingredient.objects.values_list('pk', 'name')
+        )
+        self._entries = (
+            [key for key, _ in entries],
+            [pk for _, pk in entries],
+        )
+
+    def search(self, term, limit=None):
+        """id совпадений: сначала по префиксу, затем по подстроке.
+
+        Просмотр названий останавливается, как только найдено limit
+        совпадений.
+        """
+
+        self.ensure_fresh()
+        keys, ids = self._entries
+        term = term.casefold()
+        start = bisect_left(keys, term)
+        end = bisect_left(keys, term + '\uffff', start)
+        if limit is not None:
+            end = min(end, start + limit)
+        matches = ids[start:end]
+        for key, pk in zip(keys, ids):
+            if limit is not None and len(matches) >= limit:
+                break
+            if term in key and not key.startswith(term):
+                matches.append(pk)
+        return matches
+
+
+class RecipeSearchIndex(IncrementalIndex):
+    """Обратный индекс слов названий, ингредиентов и описаний рецептов.
+
+    Используется вместо поискового вектора, когда база не PostgreSQL.
+    После изменения рецептов перестраиваются только их слова; словари
+    индекса не изменяются на месте, а заменяются, поэтому поиск идет без
+    блокировки.
+    """
+
+    generation_key = 'recipe-search-index-generation'
+    version_key = 'recipe-search-index-version'
+    changes_key = 'recipe-search-index-changes:{version}'
+
+    def __init__(self):
+        super().__init__()
+        self._recipes = {}
+        self._postings = {}
+
+    @staticmethod
+    def load_words(recipe_ids=None):
+        """{id рецепта: {слово: вес}} для recipe_ids или всех рецептов."""
+
+        words = defaultdict(lambda: defaultdict(float))
+        recipes = Recipe.objects.all()
+        ingredients = RecipeIngredient.objects.all()
+        if recipe_ids is not None:
+            recipes = recipes.filter(pk__in=recipe_ids)
+            ingredients = ingredients.filter(recipe_id__in=recipe_ids)
+
+        def add(pk, value, field):
+            for word in tokenize(value):
+                words[pk][word] += RECIPE_FIELD_WEIGHTS[field]
+
+        for pk, name, text in recipes.values_list(
+            'pk', 'name', 'text'
+        ).iterator():
+            add(pk, name, 'name')
+            add(pk, text, 'text')
+        for pk, name in ingredients.values_list(
+            'recipe_id', 'ingredient__name'
+        ).iterator():
+            add(pk, name, 'ingredients')
+        return {pk: dict(weights) for pk, weights in words.items()}
+
+    def build(self):
+        recipes = self.load_words()
+        postings = defaultdict(dict)
+        for pk, weights in recipes.items():
+            for word, weight in weights.items():
+                postings[word][pk] = weight
+        self._recipes = recipes
+        self._postings = dict(postings)
+
+    def update(self, recipe_ids):
+        recipes = self.load_words(recipe_ids)
+        changes = defaultdict(dict)
+        for recipe_id in recipe_ids:
+            old = self._recipes.get(recipe_id, {})
+            new = recipes.get(recipe_id, {})
+            for word in old.keys() | new.keys():
+                if old.get(word) != new.get(word):
+                    changes[word][recipe_id] = new.get(word)
+            if new:
+                self._recipes[recipe_id] = new
+            else:
+                self._recipes.pop(recipe_id, None)
+        for word, weights in changes.items():
+            scores = dict(self._postings.get(word, {}))
+            for recipe_id, weight in weights.items():
+                if weight is None:
+                    scores.pop(recipe_id, None)
+                else:
+                    scores[recipe_id] = weight
+            if scores:
+                self._postings[word] = scores
+            else:
+                self._postings.pop(word, None)
+
+    def search(self, term):
+        """Возвращает {id: ранг} рецептов, содержащих все слова запроса."""
+
+        self.ensure_fresh()
+        words = set(tokenize(term))
+        if not words:
+            return {}
+        postings = sorted(
+            (self._postings.get(word, {}) for word in words), key=len
+        )
+        ranks = dict(postings[0])
+        for scores in postings[1:]:
+            ranks = {
+                pk: rank + scores[pk]
+                for pk, rank in ranks.items() if pk in scores
+            }
+        return ranks
+
+
+class CoverageRanking:
+    """Рецепты по убыванию доли имеющихся ингредиентов.
+
+    Элементы - кортежи (покрытие, число совпавших ингредиентов, id
+    рецепта). Для страницы сортируются только рецепты до ее конца, а не
+    все совпадения.
+    """
+
+    def __init__(self, items):
+        self.items = items
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if index.stop is None:
+            return sorted(self.items, reverse=True)[index]
+        return heapq.nlargest(index.stop, self.items)[index]
+
+
+class RecipeIngredientIndex(IncrementalIndex):
+    """Обратный индекс ингредиентов рецептов для подбора по продуктам.
+
+    Для каждого ингредиента хранится множество рецептов с ним, для
+    каждого рецепта - множество его ингредиентов. Множества не изменяются
+    на месте, а заменяются, поэтому поиск идет без блокировки.
+    """
+
+    generation_key = 'recipe-ingredient-index-generation'
+    version_key = 'recipe-ingredient-index-version'
+    changes_key = 'recipe-ingredient-index-changes:{version}'
+
+    def __init__(self):
+        super().__init__()
+        self._recipes = {}
+        self._postings = {}
+
+    def build(self):
+        recipes = defaultdict(set)
+        postings = defaultdict(set)
+        for recipe_id, ingredient_id in RecipeIngredient.objects.values_list(
+            'recipe_id', 'ingredient_id'
+        ).iterator():
+            recipes[recipe_id].add(ingredient_id)
+            postings[ingredient_id].add(recipe_id)
+        self._recipes = {
+            recipe_id: frozenset(ingredients)
+            for recipe_id, ingredients in recipes.items()
+        }
+        self._postings = {
+            ingredient_id: frozenset(recipe_ids)
+            for ingredient_id, recipe_ids in postings.items()
+        }
+
+    def update(self, recipe_ids):
+        recipes = {recipe_id: set() for recipe_id in recipe_ids}
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id'):
+            recipes[recipe_id].add(ingredient_id)
+        for recipe_id, ingredients in recipes.items():
+            old = self._recipes.get(recipe_id, frozenset())
+            for ingredient_id in old - ingredients:
+                self._postings[ingredient_id] = (
+                    self._postings[ingredient_id] - {recipe_id}
+                )
+            for ingredient_id in ingredients - old:
+                self._postings[ingredient_id] = (
+                    self._postings.get(ingredient_id, frozenset())
+                    | {recipe_id}
+                )
+            if ingredients:
+                self._recipes[recipe_id] = frozenset(ingredients)
+            else:
+                self._recipes.pop(recipe_id, None)
+
+    def match(self, ingredient_ids, min_coverage=0):
+        """Рецепты хотя бы с одним из ингредиентов по убыванию покрытия."""
+
+        self.ensure_fresh()
+        matched = Counter()
+        for ingredient_id in set(ingredient_ids):
+            matched.update(self._postings.get(ingredient_id, ()))
+        items = []
+        for recipe_id, count in matched.items():
+            # Рецепт мог быть удален из индекса после подсчета совпадений.
+            total = len(self._recipes.get(recipe_id, ()))
+            if total and count / total >= min_coverage:
+                items.append((count / total, count, recipe_id))
+        return CoverageRanking(items)
+
+
+ingredient_index = IngredientPrefixIndex()
+recipe_search_index = RecipeSearchIndex()
+recipe_ingredient_index = RecipeIngredientIndex()
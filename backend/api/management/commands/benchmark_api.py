@@ -0,0 +1,398 @@
+import io
+import json
+import random
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (CaptureQueriesContext, setup_test_environment,
+                               teardown_test_environment)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Follow, User
+
+DEFAULT_BASELINE = Path(__file__).resolve().parents[2] / (
+    'benchmarks/baselines.json'
+)
+DEFAULT_INGREDIENTS = settings.BASE_DIR.parent / 'data' / 'ingredients.csv'
+BATCH_SIZE = 1000
+BATCH_RECIPES = 30
+NEW_RECIPE_NAME = 'Новый рецепт'
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет тестовую базу синтетическими данными, замеряет '
+        'количество запросов, время и размер ответа каждого маршрута API '
+        'и сравнивает результаты с сохраненными базовыми значениями.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--recipes', type=int, default=3000)
+        parser.add_argument('--follows', type=int, default=10,
+                            help='Подписок на пользователя.')
+        parser.add_argument('--favorites', type=int, default=10,
+                            help='Избранных рецептов на пользователя.')
+        parser.add_argument('--carts', type=int, default=5,
+                            help='Рецептов в корзине на пользователя.')
+        parser.add_argument('--recipe-ingredients', type=int, default=8)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--ingredients', default=DEFAULT_INGREDIENTS)
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+        parser.add_argument(
+            '--time-tolerance', type=float, default=1.5,
+            help='Допустимый рост времени ответа относительно базового.'
+        )
+        parser.add_argument(
+            '--time-slack', type=float, default=5.0,
+            help='Рост времени ответа в мс, который не считается регрессией.'
+        )
+        parser.add_argument(
+            '--update-baseline', action='store_true',
+            help='Перезаписать базовые значения текущими результатами.'
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.random = random.Random(options['seed'])
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True
+        )
+        try:
+            self.seed()
+            results = self.run_scenarios()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.report(results)
+        if options['update_baseline']:
+            self.save_baseline(results)
+        else:
+            self.compare(results)
+
+    @property
+    def dataset(self):
+        return {
+            key: self.options[key]
+            for key in (
+                'users', 'recipes', 'follows', 'favorites', 'carts',
+                'recipe_ingredients', 'seed',
+            )
+        }
+
+    def seed(self):
+        started = time.perf_counter()
+        options = self.options
+        call_command(
+            'load_ingredients', options['ingredients'], stdout=io.StringIO()
+        )
+        Tag.objects.bulk_create(
+            Tag(name=name, color=color, slug=slug)
+            for name, color, slug in TAGS
+        )
+        password = make_password('benchmark')
+        User.objects.bulk_create(
+            (
+                User(
+                    username=f'user{number}',
+                    email=f'user{number}@foodgram.test',
+                    first_name='Имя',
+                    last_name='Фамилия',
+                    password=password,
+                )
+                for number in range(options['users'])
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        user_ids = list(User.objects.values_list('id', flat=True))
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author_id=self.random.choice(user_ids),
+                    name=f'Рецепт {number}',
+                    image='recipes/images/benchmark.png',
+                    text='Описание рецепта. ' * 20,
+                    cooking_time=self.random.randint(
+                        settings.MIN_COOKING_TIME, settings.MAX_COOKING_TIME
+                    ),
+                )
+                for number in range(options['recipes'])
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        RecipeIngredient.objects.bulk_create(
+            (
+                RecipeIngredient(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=self.random.randint(1, 500),
+                )
+                for recipe_id in recipe_ids
+                for ingredient_id in self.random.sample(
+                    ingredient_ids, options['recipe_ingredients']
+                )
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        Recipe.tags.through.objects.bulk_create(
+            (
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in recipe_ids
+                for tag_id in self.random.sample(
+                    tag_ids, self.random.randint(1, len(tag_ids))
+                )
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        for model, key, population, count in (
+            (Follow, 'following_id', user_ids, options['follows']),
+            (Favorite, 'recipe_id', recipe_ids, options['favorites']),
+            (ShoppingCart, 'recipe_id', recipe_ids, options['carts']),
+        ):
+            model.objects.bulk_create(
+                (
+                    model(user_id=user_id, **{key: related_id})
+                    for user_id in user_ids
+                    for related_id in self.random.sample(population, count)
+                    if related_id != user_id or model is not Follow
+                ),
+                batch_size=BATCH_SIZE,
+            )
+        call_command('recount', stdout=io.StringIO())
+        if connection.vendor == 'postgresql':
+            call_command('update_search_vectors', stdout=io.StringIO())
+        call_command('build_recommendations', stdout=io.StringIO())
+        self.stdout.write(
+            f'Данные созданы за {time.perf_counter() - started:.1f} с.'
+        )
+
+    def get_scenarios(self):
+        user = User.objects.order_by('id').first()
+        author = Recipe.objects.values_list('author_id', flat=True).first()
+        recipe = Recipe.objects.values_list('id', flat=True).first()
+        ingredient = Ingredient.objects.values_list('id', flat=True).first()
+        tag = Tag.objects.values_list('id', flat=True).first()
+        other_recipes = list(
+            Recipe.objects
+            .exclude(favorites__user=user)
+            .exclude(carts__user=user)
+            .values_list('id', flat=True)[:BATCH_RECIPES + 1]
+        )
+        other_recipe = other_recipes[0]
+        batch = {'recipes': other_recipes[1:]}
+        other_user = (
+            User.objects
+            .exclude(id=user.id)
+            .exclude(following__user=user)
+            .values_list('id', flat=True)
+            .first()
+        )
+        recipe_data = {
+            'ingredients': [{'id': ingredient, 'amount': 10}],
+            'tags': [tag],
+            'image': (
+                'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgM'
+                'AAABieywaAAAACVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOx'
+                'AGVKw4bAAAACklEQVQImWNoAAAAggCByxOyYQAAAABJRU5ErkJggg=='
+            ),
+            'name': NEW_RECIPE_NAME,
+            'text': 'Описание',
+            'cooking_time': 10,
+        }
+        slugs = '&'.join(f'tags={slug}' for _, _, slug in TAGS[:2])
+        pantry = '&'.join(
+            f'ingredients={ingredient_id}'
+            for ingredient_id in Ingredient.objects.order_by(
+                'id'
+            ).values_list('id', flat=True)[:20]
+        )
+        deep_page = max(
+            self.options['recipes']
+            // settings.REST_FRAMEWORK['PAGE_SIZE'] * 9 // 10,
+            1,
+        )
+        return user, (
+            ('tags-list', 'anon', 'get', '/api/tags/', None),
+            ('tags-detail', 'anon', 'get', f'/api/tags/{tag}/', None),
+            ('ingredients-list', 'anon', 'get', '/api/ingredients/', None),
+            ('ingredients-search', 'anon', 'get',
+             '/api/ingredients/?name=са', None),
+            ('ingredients-detail', 'anon', 'get',
+             f'/api/ingredients/{ingredient}/', None),
+            ('recipes-list-anon', 'anon', 'get', '/api/recipes/', None),
+            ('recipes-list-anon-cached', 'anon', 'get',
+             '/api/recipes/', None),
+            ('recipes-list', 'auth', 'get', '/api/recipes/', None),
+            ('recipes-list-limit', 'auth', 'get',
+             '/api/recipes/?limit=50', None),
+            ('recipes-list-deep-page', 'auth', 'get',
+             f'/api/recipes/?page={deep_page}', None),
+            ('recipes-list-cursor', 'auth', 'get',
+             '/api/recipes/?cursor=', None),
+            ('recipes-list-tags', 'auth', 'get',
+             f'/api/recipes/?{slugs}', None),
+            ('recipes-list-author', 'auth', 'get',
+             f'/api/recipes/?author={author}', None),
+            ('recipes-search', 'auth', 'get',
+             '/api/recipes/?search=рецепт', None),
+            ('recipes-can-cook', 'auth', 'get',
+             f'/api/recipes/can_cook/?{pantry}', None),
+            ('recipes-recommended', 'auth', 'get',
+             '/api/recipes/recommended/', None),
+            ('recipes-list-favorited', 'auth', 'get',
+             '/api/recipes/?is_favorited=1', None),
+            ('recipes-list-in-cart', 'auth', 'get',
+             '/api/recipes/?is_in_shopping_cart=1', None),
+            ('recipes-detail', 'auth', 'get',
+             f'/api/recipes/{recipe}/', None),
+            ('recipes-create', 'auth', 'post', '/api/recipes/', recipe_data),
+            ('recipes-favorite-add', 'auth', 'post',
+             f'/api/recipes/{other_recipe}/favorite/', None),
+            ('recipes-favorite-delete', 'auth', 'delete',
+             f'/api/recipes/{other_recipe}/favorite/', None),
+            ('recipes-cart-add', 'auth', 'post',
+             f'/api/recipes/{other_recipe}/shopping_cart/', None),
+            ('recipes-cart-delete', 'auth', 'delete',
+             f'/api/recipes/{other_recipe}/shopping_cart/', None),
+            ('recipes-favorite-batch-add', 'auth', 'post',
+             '/api/recipes/favorite/', batch),
+            ('recipes-favorite-batch-delete', 'auth', 'delete',
+             '/api/recipes/favorite/', batch),
+            ('recipes-cart-batch-add', 'auth', 'post',
+             '/api/recipes/shopping_cart/', batch),
+            ('recipes-cart-batch-delete', 'auth', 'delete',
+             '/api/recipes/shopping_cart/', batch),
+            ('recipes-download-cart', 'auth', 'get',
+             '/api/recipes/download_shopping_cart/', None),
+            ('users-list', 'auth', 'get', '/api/users/', None),
+            ('users-search', 'auth', 'get', '/api/users/?search=user1',
+             None),
+            ('users-detail', 'auth', 'get', f'/api/users/{author}/', None),
+            ('users-me', 'auth', 'get', '/api/users/me/', None),
+            ('users-subscriptions', 'auth', 'get',
+             '/api/users/subscriptions/?recipes_limit=3', None),
+            ('users-subscribe', 'auth', 'post',
+             f'/api/users/{other_user}/subscribe/?recipes_limit=3', None),
+            ('users-unsubscribe', 'auth', 'delete',
+             f'/api/users/{other_user}/subscribe/', None),
+        )
+
+    def run_scenarios(self):
+        user, scenarios = self.get_scenarios()
+        token = Token.objects.create(user=user)
+        clients = {'anon': APIClient(), 'auth': APIClient()}
+        clients['auth'].credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        measurements = {name: [] for name, *_ in scenarios}
+        # Первый проход не учитывается: он прогревает кэши и индексы.
+        for run in range(self.options['repeat'] + 1):
+            for name, client, method, url, data in scenarios:
+                request = getattr(clients[client], method)
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    response = request(url, data, format='json')
+                    content = b''.join(
+                        response.streaming_content
+                    ) if response.streaming else response.content
+                    elapsed = time.perf_counter() - started
+                if response.status_code >= 400:
+                    raise CommandError(
+                        f'{name}: {method.upper()} {url} вернул '
+                        f'{response.status_code}: {content[:200]!r}'
+                    )
+                if run:
+                    measurements[name].append(
+                        (len(queries), elapsed, len(content))
+                    )
+            Recipe.objects.filter(name=NEW_RECIPE_NAME).delete()
+        return {
+            name: {
+                'queries': max(queries for queries, _, _ in runs),
+                'time_ms': round(
+                    min(elapsed for _, elapsed, _ in runs) * 1000, 2
+                ),
+                'bytes': runs[-1][2],
+            }
+            for name, runs in measurements.items()
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"маршрут":<32}{"запросы":>10}{"мс":>10}{"байты":>10}'
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<32}{result["queries"]:>10}'
+                f'{result["time_ms"]:>10.2f}{result["bytes"]:>10}'
+            )
+
+    def save_baseline(self, results):
+        path = Path(self.options['baseline'])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(
+            json.dumps(
+                {'dataset': self.dataset, 'results': results},
+                ensure_ascii=False,
+                indent=4,
+            ) + '\n',
+            encoding='utf-8',
+        )
+        self.stdout.write(self.style.SUCCESS(f'Базовые значения: {path}'))
+
+    def compare(self, results):
+        path = Path(self.options['baseline'])
+        if not path.exists():
+            raise CommandError(
+                f'Нет базовых значений {path}, запустите с --update-baseline.'
+            )
+        baseline = json.loads(path.read_text(encoding='utf-8'))
+        if baseline['dataset'] != self.dataset:
+            self.stdout.write(self.style.WARNING(
+                'Параметры данных отличаются от базовых, время ответа '
+                'не сравнивается.'
+            ))
+        compare_time = baseline['dataset'] == self.dataset
+        tolerance = self.options['time_tolerance']
+        slack = self.options['time_slack']
+        regressions = []
+        for name, result in results.items():
+            expected = baseline['results'].get(name)
+            if expected is None:
+                continue
+            if result['queries'] > expected['queries']:
+                regressions.append(
+                    f'{name}: запросов {result["queries"]} '
+                    f'> {expected["queries"]}'
+                )
+            if (
+                compare_time
+                and result['time_ms'] > expected['time_ms'] * tolerance
+                and result['time_ms'] - expected['time_ms'] > slack
+            ):
+                regressions.append(
+                    f'{name}: {result["time_ms"]} мс '
+                    f'> {expected["time_ms"]} мс x {tolerance}'
+                )
+        if regressions:
+            raise CommandError(
+                'Регрессии производительности:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий не найдено.'))
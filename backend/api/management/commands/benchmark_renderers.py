@@ -0,0 +1,69 @@
+import io
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api import renderers
+from api.serializers import RecipeReadSerializer
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает скорость стандартных рендерера и парсера JSON DRF с '
+        'FastJSONRenderer и FastJSONParser на ответе RecipeReadSerializer '
+        'для рецептов из базы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if renderers.orjson is None:
+            raise CommandError('orjson не установлен.')
+        recipes = list(
+            Recipe.objects.for_read(AnonymousUser())[:options['recipes']]
+        )
+        if not recipes:
+            raise CommandError('В базе нет рецептов.')
+        data = RecipeReadSerializer(recipes, many=True).data
+        content = JSONRenderer().render(data)
+        if renderers.FastJSONRenderer().render(data) != content:
+            raise CommandError('Ответы рендереров различаются.')
+        self.stdout.write(
+            f'{len(recipes)} рецептов, {len(content)} байт, '
+            f'{options["repeat"]} повторов'
+        )
+        self.stdout.write(f'{"":<24}{"МБ/с":>10}{"ускорение":>12}')
+        for name, stock, fast in (
+            (
+                'рендеринг',
+                lambda: JSONRenderer().render(data),
+                lambda: renderers.FastJSONRenderer().render(data),
+            ),
+            (
+                'разбор',
+                lambda: JSONParser().parse(io.BytesIO(content)),
+                lambda: renderers.FastJSONParser().parse(io.BytesIO(content)),
+            ),
+        ):
+            stock_speed = self.measure(stock, len(content), options['repeat'])
+            fast_speed = self.measure(fast, len(content), options['repeat'])
+            self.stdout.write(f'{name + " DRF":<24}{stock_speed:>10.1f}')
+            self.stdout.write(
+                f'{name + " orjson":<24}{fast_speed:>10.1f}'
+                f'{fast_speed / stock_speed:>11.1f}x'
+            )
+
+    @staticmethod
+    def measure(function, size, repeat):
+        """Скорость обработки в мегабайтах в секунду."""
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            function()
+        return size * repeat / (time.perf_counter() - started) / 1e6
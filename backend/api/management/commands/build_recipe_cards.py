@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from api.cards import build_cards
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает карточки всех рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Количество рецептов в одной пачке.'
+        )
+
+    def handle(self, *args, **options):
+        recipe_ids = list(
+            Recipe.objects.order_by('id').values_list('id', flat=True)
+        )
+        size = options['batch_size']
+        for start in range(0, len(recipe_ids), size):
+            build_cards(recipe_ids[start:start + size])
+        self.stdout.write(self.style.SUCCESS(
+            f'Построены карточки {len(recipe_ids)} рецептов.'
+        ))
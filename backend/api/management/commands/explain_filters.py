@@ -0,0 +1,113 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.views import RecipeViewSet
+from recipes.models import Tag
+from users.models import User
+
+PAGE_SIZE = 6
+SEQ_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'SCAN (?:TABLE )?(\w+)(?!.*USING)'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет EXPLAIN ANALYZE для основных комбинаций фильтров списка '
+        'рецептов и сообщает, какие таблицы читаются без индекса. Планы '
+        'имеют смысл на данных реального объема.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Пользователь для фильтров избранного и корзины, по '
+                 'умолчанию пользователь с наибольшим избранным.'
+        )
+        parser.add_argument(
+            '--ignore', nargs='*', default=['recipes_tag'],
+            help='Небольшие таблицы, полный просмотр которых допустим.'
+        )
+        parser.add_argument(
+            '--fail-on-seq-scan', action='store_true',
+            help='Завершиться с ошибкой при полном просмотре таблицы.'
+        )
+
+    def handle(self, *args, **options):
+        pattern = SEQ_SCAN.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(
+                f'База данных {connection.vendor} не поддерживается.'
+            )
+        user = self.get_user(options['user'])
+        failures = []
+        for name, params in self.get_combinations(user):
+            plan = self.explain(user, params)
+            tables = sorted(
+                set(pattern.findall(plan)) - set(options['ignore'])
+            )
+            if tables:
+                failures.append(name)
+                self.stdout.write(self.style.WARNING(
+                    f'{name:<28}полный просмотр: {", ".join(tables)}'
+                ))
+            else:
+                self.stdout.write(f'{name:<28}индексы')
+            if options['verbosity'] > 1:
+                self.stdout.write(plan + '\n')
+        if failures and options['fail_on_seq_scan']:
+            raise CommandError(
+                'Полный просмотр таблиц: ' + ', '.join(failures)
+            )
+
+    @staticmethod
+    def get_user(username):
+        if username is not None:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'Пользователь {username} не найден.')
+        user = User.objects.annotate(
+            favorites_total=Count('favorites')
+        ).order_by('-favorites_total').first()
+        if user is None:
+            raise CommandError('В базе нет пользователей.')
+        return user
+
+    @staticmethod
+    def get_combinations(user):
+        author = User.objects.order_by('-recipes_count').first()
+        tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+        return (
+            ('без фильтров', {}),
+            ('теги', {'tags': tags}),
+            ('автор', {'author': author.pk}),
+            ('автор и теги', {'author': author.pk, 'tags': tags}),
+            ('избранное', {'is_favorited': 1}),
+            ('избранное и теги', {'is_favorited': 1, 'tags': tags}),
+            ('корзина', {'is_in_shopping_cart': 1}),
+        )
+
+    @staticmethod
+    def explain(user, params):
+        """План запроса первой страницы, построенного как во вьюсете."""
+
+        request = APIRequestFactory().get('/api/recipes/', params)
+        force_authenticate(request, user=user)
+        view = RecipeViewSet(
+            request=Request(request),
+            action='list',
+            format_kwarg=None,
+            args=(),
+            kwargs={},
+        )
+        queryset = view.filter_queryset(view.get_queryset())[:PAGE_SIZE]
+        if connection.vendor == 'postgresql':
+            return queryset.explain(analyze=True)
+        return queryset.explain()
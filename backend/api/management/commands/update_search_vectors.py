@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.search import update_search_vectors
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает поисковые векторы всех рецептов в PostgreSQL.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество рецептов в одной пачке.'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError(
+                'Поисковые векторы хранятся только в PostgreSQL.'
+            )
+        recipe_ids = list(
+            Recipe.objects.order_by('id').values_list('id', flat=True)
+        )
+        size = options['batch_size']
+        for start in range(0, len(recipe_ids), size):
+            update_search_vectors(recipe_ids[start:start + size])
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлены поисковые векторы {len(recipe_ids)} рецептов.'
+        ))
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:42
+
+import api.models
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата и время')),
+                ('view', models.CharField(max_length=200, verbose_name='Представление')),
+                ('path', models.TextField(verbose_name='Адрес запроса')),
+                ('duration_ms', models.FloatField(verbose_name='Длительность, мс')),
+                ('profiler', models.CharField(max_length=200, verbose_name='Профилировщик')),
+                ('file', models.FileField(storage=api.models.get_profile_storage, upload_to='', verbose_name='Файл профиля')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Профиль запроса',
+                'verbose_name_plural': 'Профили запросов',
+                'ordering': ('-created', '-id'),
+            },
+        ),
+    ]
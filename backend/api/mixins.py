@@ -1,9 +1,19 @@
+import time
+
+from django.conf import settings
+from django.db import transaction
 from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404
 from rest_framework import mixins, status, viewsets
 from rest_framework.response import Response
 
+from api.cache import (count_response_cache, get_response_cache,
+                       get_response_key)
+from api.profiling import save_profile, start_profiler, wants_profile
+from api.serializers import RecipeIdsSerializer
+from recipes.counters import batch_counter_changes
 from recipes.models import Favorite, ShoppingCart
+from recipes.signals import recipes_bulk_changed
 from users.models import Follow
 
 
@@ -85,6 +95,166 @@ class AddDeleteMixin:
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def get_batch_ids(self):
+        serializer = RecipeIdsSerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['recipes']
+
+    def add_relations(self, handler):
+        """Добавляет в избранное или корзину сразу несколько рецептов.
+
+        Количество запросов не зависит от числа рецептов, для каждого id
+        возвращается статус: created, exists или not_found.
+        """
+
+        user = self.request.user
+        model = self.handlers[handler]['model']
+        ids = self.get_batch_ids()
+        found = set(
+            self.queryset.filter(id__in=ids).values_list('id', flat=True)
+        )
+        existing = set(
+            model.objects.filter(user=user, recipe_id__in=found)
+            .values_list('recipe_id', flat=True)
+        )
+        created = [id for id in ids if id in found - existing]
+        with transaction.atomic():
+            model.objects.bulk_create(
+                [model(user=user, recipe_id=id) for id in created],
+                ignore_conflicts=True,
+            )
+            if created:
+                recipes_bulk_changed.send(
+                    sender=model, user_id=user.id,
+                    recipe_ids=created, delta=1,
+                )
+        statuses = {id: 'exists' for id in existing}
+        statuses.update({id: 'created' for id in created})
+        return Response(
+            [
+                {'id': id, 'status': statuses.get(id, 'not_found')}
+                for id in ids
+            ],
+            status=status.HTTP_200_OK,
+        )
+
+    def delete_relations(self, handler):
+        """Удаляет из избранного или корзины сразу несколько рецептов.
+
+        Для каждого id возвращается статус: deleted или not_found.
+        """
+
+        user = self.request.user
+        model = self.handlers[handler]['model']
+        ids = self.get_batch_ids()
+        relations = model.objects.filter(user=user, recipe_id__in=ids)
+        with transaction.atomic():
+            deleted = set(
+                relations.select_for_update().values_list(
+                    'recipe_id', flat=True
+                )
+            )
+            # Счетчики и кэш обновляются по post_delete удаленных строк,
+            # счетчики - одним запросом на всю пачку.
+            with batch_counter_changes():
+                relations.delete()
+        return Response(
+            [
+                {
+                    'id': id,
+                    'status': 'deleted' if id in deleted else 'not_found',
+                }
+                for id in ids
+            ],
+            status=status.HTTP_200_OK,
+        )
+
+
+class ResponseCacheMixin:
+    """Миксин кэширования ответов list и retrieve.
+
+    Ключ строится из пути, параметров запроса и поколения данных,
+    которое меняется при любом изменении рецептов, тегов и ингредиентов.
+    """
+
+    cache_anonymous_only = False
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        if not self.is_response_cacheable(request):
+            return handler(request, *args, **kwargs)
+        key = get_response_key(request, request.accepted_renderer.format)
+        response = self.read_cached_response(key)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            self.write_cached_response(key, response)
+        return response
+
+    def is_response_cacheable(self, request):
+        return not (
+            self.cache_anonymous_only and request.user.is_authenticated
+        )
+
+    def read_cached_response(self, key):
+        cached = get_response_cache().get(key)
+        if cached is None:
+            count_response_cache(self.basename, 'miss')
+            return None
+        count_response_cache(self.basename, 'hit')
+        data, status_code = cached
+        response = Response(data, status=status_code)
+        response['X-Cache'] = 'HIT'
+        return response
+
+    def write_cached_response(self, key, response):
+        if response.status_code == status.HTTP_200_OK:
+            get_response_cache().set(
+                key,
+                (response.data, response.status_code),
+                settings.API_CACHE_TIMEOUT,
+            )
+        response['X-Cache'] = 'MISS'
+
+
+class ProfileRequestMixin:
+    """Миксин профилирования запросов сотрудников.
+
+    Профиль снимается, если запрос сотрудника содержит заголовок
+    X-Profile или параметр profile, его id возвращается в X-Profile-Id.
+    """
+
+    profiler = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.user.is_staff and wants_profile(request):
+            self.profile_started = time.perf_counter()
+            self.profiler = start_profiler()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if self.profiler is not None:
+            profile = save_profile(
+                self.profiler,
+                request,
+                f'{type(self).__name__}.{self.action}',
+                time.perf_counter() - self.profile_started,
+            )
+            self.profiler = None
+            response['X-Profile-Id'] = profile.pk
+        return response
+
 
 class ListCreateRetrieveViewSet(
     mixins.ListModelMixin,
@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+
+from users.models import User
+
+profile_storage = FileSystemStorage(location=settings.PROFILES_ROOT)
+
+
+def get_profile_storage():
+    return profile_storage
+
+
+class RequestProfile(models.Model):
+    """Профиль выполнения отдельного запроса к API."""
+
+    created = models.DateTimeField(
+        verbose_name='Дата и время',
+        auto_now_add=True,
+    )
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        on_delete=models.SET_NULL,
+        null=True,
+    )
+    view = models.CharField(
+        verbose_name='Представление',
+        max_length=settings.NAME_LEN,
+    )
+    path = models.TextField(
+        verbose_name='Адрес запроса',
+    )
+    duration_ms = models.FloatField(
+        verbose_name='Длительность, мс',
+    )
+    profiler = models.CharField(
+        verbose_name='Профилировщик',
+        max_length=settings.NAME_LEN,
+    )
+    file = models.FileField(
+        verbose_name='Файл профиля',
+        storage=get_profile_storage,
+    )
+
+    class Meta:
+        ordering = ('-created', '-id')
+        verbose_name = 'Профиль запроса'
+        verbose_name_plural = 'Профили запросов'
+
+    def __str__(self):
+        return f'{self.view} {self.created:%Y-%m-%d %H:%M:%S}'
@@ -1,11 +1,177 @@
+import base64
+import binascii
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from api.cache import get_content_generation, get_response_cache
+
+COUNT_KEY = 'api-count:{table}:{generation}'
+
+
+def get_estimated_count(queryset):
+    """Оценка числа строк таблицы по статистике PostgreSQL."""
+
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] < settings.APPROXIMATE_COUNT_MIN:
+        return None
+    return int(row[0])
+
+
+def get_cached_count(queryset):
+    """Точное число строк таблицы, закэшированное до изменения данных."""
+
+    response_cache = get_response_cache()
+    key = COUNT_KEY.format(
+        table=queryset.model._meta.db_table,
+        generation=get_content_generation(),
+    )
+    count = response_cache.get(key)
+    if count is None:
+        count = queryset.count()
+        response_cache.set(key, count, settings.API_CACHE_TIMEOUT)
+    return count
+
+
+class CountPaginator(Paginator):
+    """Пагинатор, не считающий COUNT(*) для всей таблицы на каждый запрос.
+
+    Число строк с фильтрами по-прежнему считается точно.
+    """
+
+    @cached_property
+    def count(self):
+        mode = settings.PAGINATION_COUNT_MODE
+        query = getattr(self.object_list, 'query', None)
+        if mode == 'exact' or query is None or query.where:
+            return super().count
+        count = None
+        if mode == 'approximate':
+            count = get_estimated_count(self.object_list)
+        if count is None:
+            count = get_cached_count(self.object_list)
+        return count
 
 
 class RecipesPagination(PageNumberPagination):
-    """Переопределенный класс базового пагинатора - рецепты."""
+    """Переопределенный класс базового пагинатора - рецепты.
+
+    С параметром cursor рецепты отдаются по ключу (pub_date, id)
+    без OFFSET и подсчета общего количества. Курсор не сочетается с
+    другой сортировкой, например по рангу поиска. Списки, уже
+    упорядоченные в памяти, всегда разбиваются на страницы по номеру.
+    """
+
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    django_paginator_class = CountPaginator
+    ordering = ('-pub_date', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = (
+            self.cursor_query_param in request.query_params
+            and isinstance(queryset, QuerySet)
+        )
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        order_by = tuple(queryset.query.order_by)
+        if order_by and order_by != self.ordering:
+            raise ValidationError({self.cursor_query_param: [
+                'Курсор нельзя использовать с этой сортировкой рецептов, '
+                'например с поиском.'
+            ]})
+        self.request = request
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            pub_date, pk = position
+            if reverse:
+                queryset = queryset.filter(
+                    Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, id__gt=pk)
+                ).order_by('pub_date', 'id')
+            else:
+                queryset = queryset.filter(
+                    Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk)
+                )
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+        has_next = has_more if not reverse else position is not None
+        has_previous = has_more if reverse else position is not None
+        self.next_cursor = (
+            self.encode_cursor(results[-1], False)
+            if results and has_next else None
+        )
+        self.previous_cursor = (
+            self.encode_cursor(results[0], True)
+            if results and has_previous else None
+        )
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict((
+            ('next', self.get_cursor_link(self.next_cursor)),
+            ('previous', self.get_cursor_link(self.previous_cursor)),
+            ('results', data),
+        )))
+
+    def decode_cursor(self, request):
+        cursor = request.query_params[self.cursor_query_param]
+        if not cursor:
+            return None, False
+        try:
+            pub_date, pk, reverse = base64.urlsafe_b64decode(
+                cursor.encode()
+            ).decode().split('|')
+            pub_date = parse_datetime(pub_date)
+            pk = int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            pub_date = None
+        if pub_date is None:
+            raise NotFound('Неверный курсор.')
+        return (pub_date, pk), reverse == '1'
+
+    @staticmethod
+    def encode_cursor(recipe, reverse):
+        value = f'{recipe.pub_date.isoformat()}|{recipe.pk}|{int(reverse)}'
+        return base64.urlsafe_b64encode(value.encode()).decode()
+
+    def get_cursor_link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.page_query_param
+        )
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+
+class UsersPagination(PageNumberPagination):
+    """Пагинатор пользователей."""
 
     page_size_query_param = 'limit'
+    django_paginator_class = CountPaginator
 
 
 class IngredientPagination(PageNumberPagination):
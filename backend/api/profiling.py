@@ -0,0 +1,286 @@
+import asyncio
+import contextvars
+import cProfile
+import logging
+import marshal
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.core.files.base import ContentFile
+from rest_framework.serializers import BaseSerializer
+
+from api.cache import response_cache_stats, response_cache_stats_lock
+from api.models import RequestProfile
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = 'profile'
+
+# Имя метрики, тип и поле статистики представления.
+METRICS = (
+    ('foodgram_requests_total', 'counter', 'requests'),
+    ('foodgram_db_queries_total', 'counter', 'queries'),
+    ('foodgram_db_seconds_total', 'counter', 'db'),
+    ('foodgram_app_seconds_total', 'counter', 'app'),
+    ('foodgram_render_seconds_total', 'counter', 'render'),
+    ('foodgram_request_seconds_total', 'counter', 'total'),
+    ('foodgram_response_bytes_total', 'counter', 'bytes'),
+)
+
+view_stats = defaultdict(Counter)
+view_stats_lock = threading.Lock()
+
+current_recorder = contextvars.ContextVar('current_recorder', default=None)
+
+
+def get_view_name(view_func, method):
+    """Имя представления вида RecipeViewSet.list или login."""
+
+    cls = getattr(view_func, 'cls', None)
+    actions = getattr(view_func, 'actions', None)
+    if cls is not None and actions:
+        action = actions.get(method.lower(), method.lower())
+        return f'{cls.__name__}.{action}'
+    return getattr(view_func, '__name__', 'unknown')
+
+
+def get_query_origin():
+    """Ближайший по стеку метод сериализатора, выполнивший запрос."""
+
+    frame = sys._getframe(1)
+    while frame is not None:
+        instance = frame.f_locals.get('self')
+        if isinstance(instance, BaseSerializer):
+            return f'{type(instance).__name__}.{frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+class QueryRecorder:
+    """Считает запросы и время в базе, записывает медленные запросы в лог.
+
+    Запросы одного HTTP-запроса могут выполняться в нескольких потоках,
+    поэтому счетчики защищены блокировкой, а время в базе - сумма по
+    всем потокам.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.count = 0
+        self.duration = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, sql, elapsed):
+        with self.lock:
+            self.count += 1
+            self.duration += elapsed
+        if elapsed * 1000 >= settings.SLOW_QUERY_MS:
+            logger.warning(
+                'Медленный запрос %.1f мс в %s (%s): %s',
+                elapsed * 1000,
+                getattr(self.request, 'profiling_view', self.request.path),
+                get_query_origin() or 'вне сериализатора',
+                sql,
+            )
+
+
+def record_query(execute, sql, params, many, context):
+    """Обертка соединений, передающая запрос QueryRecorder текущего запроса.
+
+    Регистрируется на каждом соединении при его создании, получатель
+    берется из контекста, поэтому учитываются и запросы из потоков, в
+    которых асинхронные представления выполняют ORM.
+    """
+
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.add(sql, time.perf_counter() - started)
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class ProfilingMiddleware:
+    """Замеряет запросы к базе, время и размер ответа каждого представления.
+
+    Время делится на db - запросы к базе, app - остальная работа
+    представления, в том числе сериализаторов, и render - отрисовка
+    ответа DRF в байты. Итоги копятся в view_stats и отдаются в формате
+    Prometheus, а при PROFILING_SERVER_TIMING еще и в заголовке
+    Server-Timing. Работает и в синхронной, и в асинхронной цепочке.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.PROFILING_ENABLED:
+            return self.get_response(request)
+        recorder = QueryRecorder(request)
+        token = current_recorder.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        return self.record(request, response, recorder, started)
+
+    async def __acall__(self, request):
+        if not settings.PROFILING_ENABLED:
+            return await self.get_response(request)
+        recorder = QueryRecorder(request)
+        token = current_recorder.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        return self.record(request, response, recorder, started)
+
+    @staticmethod
+    def record(request, response, recorder, started):
+        finished = time.perf_counter()
+        view_name = getattr(request, 'profiling_view', None)
+        if view_name is None:
+            return response
+        view_finished = getattr(request, 'profiling_view_finished', finished)
+        rendered = getattr(request, 'profiling_rendered', view_finished)
+        view_time = view_finished - request.profiling_view_started
+        timings = {
+            'db': recorder.duration,
+            'app': max(view_time - recorder.duration, 0),
+            'render': rendered - view_finished,
+            'total': finished - started,
+        }
+        with view_stats_lock:
+            view_stats[view_name].update(
+                requests=1,
+                queries=recorder.count,
+                bytes=0 if response.streaming else len(response.content),
+                **timings,
+            )
+        if settings.PROFILING_SERVER_TIMING:
+            response['Server-Timing'] = ', '.join(
+                f'{name};dur={value * 1000:.1f}'
+                + (f';desc="{recorder.count} queries"' if name == 'db' else '')
+                for name, value in timings.items()
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if settings.PROFILING_ENABLED:
+            request.profiling_view = get_view_name(view_func, request.method)
+            request.profiling_view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        if settings.PROFILING_ENABLED:
+            request.profiling_view_finished = time.perf_counter()
+            response.add_post_render_callback(
+                lambda response: setattr(
+                    request, 'profiling_rendered', time.perf_counter()
+                )
+            )
+        return response
+
+
+def export_metrics():
+    """Статистика представлений и кэша ответов в формате Prometheus."""
+
+    with view_stats_lock:
+        stats = {name: Counter(values) for name, values in view_stats.items()}
+    with response_cache_stats_lock:
+        cache_stats = Counter(response_cache_stats)
+    lines = []
+    for metric, kind, field in METRICS:
+        lines.append(f'# TYPE {metric} {kind}')
+        lines.extend(
+            f'{metric}{{view="{name}"}} {values[field]}'
+            for name, values in sorted(stats.items())
+        )
+    lines.append('# TYPE foodgram_response_cache_total counter')
+    lines.extend(
+        f'foodgram_response_cache_total{{view="{name}",result="{result}"}} '
+        f'{count}'
+        for (name, result), count in sorted(cache_stats.items())
+    )
+    return '\n'.join(lines) + '\n'
+
+
+def wants_profile(request):
+    return bool(
+        request.META.get(PROFILE_HEADER) or request.GET.get(PROFILE_PARAM)
+    )
+
+
+def start_profiler():
+    """Запускает pyinstrument, если он установлен, иначе cProfile."""
+
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    profiler = Profiler(
+        interval=settings.PROFILING_SAMPLE_INTERVAL, async_mode='disabled'
+    )
+    profiler.start()
+    return profiler
+
+
+def stop_profiler(profiler):
+    """Останавливает профилировщик и возвращает имя формата и файл."""
+
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        profiler.create_stats()
+        # Формат pstats.Stats.dump_stats, файл открывается snakeviz и pstats.
+        return 'cprofile', 'pstats', marshal.dumps(profiler.stats)
+    from pyinstrument.renderers import SpeedscopeRenderer
+
+    profiler.stop()
+    return (
+        'pyinstrument',
+        'speedscope.json',
+        profiler.output(SpeedscopeRenderer()).encode(),
+    )
+
+
+def save_profile(profiler, request, view_name, duration):
+    """Сохраняет профиль и удаляет самые старые сверх PROFILES_MAX."""
+
+    name, extension, content = stop_profiler(profiler)
+    profile = RequestProfile(
+        user=request.user,
+        view=view_name,
+        path=request.get_full_path(),
+        duration_ms=duration * 1000,
+        profiler=name,
+    )
+    profile.file.save(
+        f'{time.strftime("%Y%m%d-%H%M%S")}-{view_name}.{extension}',
+        ContentFile(content),
+    )
+    for stale in RequestProfile.objects.all()[settings.PROFILES_MAX:]:
+        stale.file.delete(save=False)
+        stale.delete()
+    return profile
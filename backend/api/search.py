@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db import connection
+from django.db.models import OuterRef, Subquery
+
+from api.indexes import recipe_search_index
+from api.transactions import CommitBatch
+from recipes.models import Recipe, RecipeIngredient
+
+
+def uses_search_vector():
+    """Ищутся ли рецепты по поисковому вектору в базе."""
+
+    mode = settings.RECIPE_SEARCH_MODE
+    return mode == 'database' or (
+        mode == 'auto' and connection.vendor == 'postgresql'
+    )
+
+
+def get_search_vector():
+    """Вектор рецепта: название (A), ингредиенты (B) и описание (C)."""
+
+    ingredient_names = RecipeIngredient.objects.filter(
+        recipe_id=OuterRef('pk'),
+    ).values('recipe_id').annotate(
+        names=StringAgg('ingredient__name', delimiter=' '),
+    ).values('names')
+    config = settings.RECIPE_SEARCH_CONFIG
+    return (
+        SearchVector('name', weight='A', config=config)
+        + SearchVector(Subquery(ingredient_names), weight='B', config=config)
+        + SearchVector('text', weight='C', config=config)
+    )
+
+
+def update_search_vectors(recipe_ids=None):
+    """Пересчитывает поисковые векторы рецептов одним UPDATE."""
+
+    if connection.vendor != 'postgresql':
+        return 0
+    recipes = Recipe.objects.all()
+    if recipe_ids is not None:
+        recipes = recipes.filter(id__in=recipe_ids)
+    return recipes.update(search_vector=get_search_vector())
+
+
+def reindex(recipe_ids):
+    update_search_vectors(recipe_ids)
+    recipe_search_index.record_changes(recipe_ids)
+
+
+# Все изменения одной транзакции пересчитывают вектор каждого рецепта один
+# раз, уже по зафиксированным данным.
+search_reindex = CommitBatch(reindex)
+
+
+def reindex_recipes(recipe_ids):
+    search_reindex.add(recipe_ids)
@@ -1,9 +1,16 @@
+import json
+from collections import OrderedDict
+
 from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 
-from api.utils import Base64ImageField
+from api.cards import attach_cards, get_card
+from api.utils import (Base64ImageField, BulkPrimaryKeyRelatedField,
+                       RenditionImageField)
 from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.signals import recipe_ingredients_changed
 from users.models import Follow, User
 from users.validators import validate_username
 
@@ -29,8 +36,11 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         follower = self.context['request'].user
-        if follower.is_anonymous:
+        # Подписка на самого себя запрещена ограничением модели Follow.
+        if follower.is_anonymous or follower.pk == obj.pk:
             return False
         return follower.follower.filter(following=obj).exists()
 
@@ -103,6 +113,34 @@ class ChangePasswordSerializer(serializers.Serializer):
     )
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id рецептов для пакетных операций."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BATCH_MAX_RECIPES,
+    )
+
+    def validate_recipes(self, recipes):
+        return list(dict.fromkeys(recipes))
+
+
+class CanCookSerializer(serializers.Serializer):
+    """Сериализатор параметров подбора рецептов по ингредиентам."""
+
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.CAN_COOK_MAX_INGREDIENTS,
+    )
+    min_coverage = serializers.FloatField(
+        min_value=0,
+        max_value=1,
+        default=0,
+    )
+
+
 class TagSerializer(serializers.ModelSerializer):
     """Сериализатор тега."""
 
@@ -154,12 +192,38 @@ class RecipeIngredientReadSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+class RecipeIngredientWriteListSerializer(serializers.ListSerializer):
+    """Сериализатор списка ингредиентов рецепта.
+
+    Существование всех ингредиентов проверяется одним запросом.
+    """
+
+    def to_internal_value(self, data):
+        ingredients = super().to_internal_value(data)
+        existing = set(
+            Ingredient.objects.filter(
+                id__in=[item['ingredient_id'] for item in ingredients]
+            ).values_list('id', flat=True)
+        )
+        message = serializers.PrimaryKeyRelatedField.default_error_messages[
+            'does_not_exist'
+        ]
+        errors = [
+            {} if item['ingredient_id'] in existing else {
+                'id': [message.format(pk_value=item['ingredient_id'])]
+            }
+            for item in ingredients
+        ]
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return ingredients
+
+
 class RecipeIngredientWriteSerializer(serializers.ModelSerializer):
     """Сериализатор для создания модели рецепт-ингредиент."""
 
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),
-        source='ingredient',
+    id = serializers.IntegerField(
+        source='ingredient_id',
     )
     amount = serializers.IntegerField(
         min_value=settings.MIN_INGR_AMOUNT,
@@ -168,22 +232,74 @@ class RecipeIngredientWriteSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = RecipeIngredient
+        list_serializer_class = RecipeIngredientWriteListSerializer
         fields = (
             'id',
             'amount',
         )
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
-    """Сериализатор для чтения рецепта."""
+class AuthorCardSerializer(serializers.ModelSerializer):
+    """Сериализатор автора в карточке рецепта."""
+
+    class Meta:
+        model = User
+        fields = (
+            'email',
+            'id',
+            'username',
+            'first_name',
+            'last_name',
+        )
+        read_only_fields = fields
+
+
+class RecipeCardSerializer(serializers.ModelSerializer):
+    """Сериализатор общей для всех пользователей части рецепта."""
 
     tags = TagSerializer(many=True,)
-    author = UserSerializer()
-    image = Base64ImageField()
+    author = AuthorCardSerializer()
+    image = RenditionImageField('medium')
     ingredients = RecipeIngredientReadSerializer(
         many=True,
         source='recipe_ingredients',
     )
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'id',
+            'tags',
+            'author',
+            'ingredients',
+            'name',
+            'image',
+            'text',
+            'cooking_time',
+        )
+        read_only_fields = fields
+
+
+class RecipeReadListSerializer(serializers.ListSerializer):
+    """Сериализатор списка рецептов.
+
+    Недостающие карточки рецептов страницы строятся одним набором
+    запросов.
+    """
+
+    def to_representation(self, data):
+        recipes = list(data.all() if hasattr(data, 'all') else data)
+        attach_cards(recipes)
+        return super().to_representation(recipes)
+
+
+class RecipeReadSerializer(RecipeCardSerializer):
+    """Сериализатор для чтения рецепта.
+
+    Рецепт собирается из карточки RecipeCard и флагов пользователя.
+    """
+
+    author = UserSerializer()
     is_favorited = serializers.SerializerMethodField(
         method_name='get_is_favorited',
     )
@@ -193,6 +309,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
+        list_serializer_class = RecipeReadListSerializer
         fields = (
             'id',
             'tags',
@@ -207,7 +324,31 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         )
         read_only_fields = fields
 
+    def to_representation(self, instance):
+        card = get_card(instance)
+        if card is None:
+            card = attach_cards([instance])[instance.pk]
+        data = json.loads(card.data)
+        data['author']['is_subscribed'] = self.get_is_subscribed(instance)
+        data['is_favorited'] = self.get_is_favorited(instance)
+        data['is_in_shopping_cart'] = self.get_is_in_shopping_cart(instance)
+        request = self.context.get('request')
+        if data['image'] and request is not None:
+            data['image'] = request.build_absolute_uri(data['image'])
+        return OrderedDict(
+            (field, data[field]) for field in self.Meta.fields
+        )
+
+    def get_is_subscribed(self, obj):
+        if hasattr(obj, 'author_is_subscribed'):
+            return obj.author_is_subscribed
+        return UserSerializer(context=self.context).get_is_subscribed(
+            obj.author
+        )
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         return (
             user.is_authenticated
@@ -215,6 +356,8 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         )
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
         return (
             user.is_authenticated
@@ -225,6 +368,8 @@ class RecipeReadSerializer(serializers.ModelSerializer):
 class RecipeInListSerializer(serializers.ModelSerializer):
     """Сериализатор с кратким отображением рецепта."""
 
+    image = RenditionImageField('thumbnail')
+
     class Meta:
         model = Recipe
         fields = (
@@ -241,7 +386,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
     author = UserSerializer(read_only=True)
     image = Base64ImageField()
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         queryset=Tag.objects.all(),
         many=True,
     )
@@ -276,13 +421,11 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Ингредиенты должны быть заданы.'
             )
-        ingredient_tuples = [
-            (ingredient['ingredient'],
-             ingredient['amount'])
-            for ingredient in ingredients
+        ingredient_ids = [
+            ingredient['ingredient_id'] for ingredient in ingredients
         ]
 
-        if len(set(ingredient_tuples)) != len(ingredients):
+        if len(set(ingredient_ids)) != len(ingredients):
             raise serializers.ValidationError(
                 'Такой ингредиент уже в рецепте.'
             )
@@ -309,44 +452,73 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         return image
 
     @staticmethod
-    def create_ingredients(recipe, ingredients):
-        ingredients.sort(
-            key=lambda ingredient: ingredient.get('ingredient').name
-        )
-        RecipeIngredient.objects.bulk_create(
-            [
-                RecipeIngredient(
-                    recipe=recipe,
-                    ingredient_id=ingredient.get('ingredient').id,
-                    amount=ingredient.get('amount')
-                )
-                for ingredient in ingredients
-            ]
-        )
+    def sync_ingredients(recipe, ingredients, created=False):
+        """Приводит ингредиенты рецепта к списку ingredients.
+
+        Изменяются только отличающиеся строки: новые создаются одним
+        bulk_create, с другим количеством - одним bulk_update, лишние
+        удаляются одним delete().
+        """
+
+        amounts = {
+            ingredient['ingredient_id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        existing = {} if created else {
+            row.ingredient_id: row for row in recipe.recipe_ingredients.all()
+        }
+        removed = [id for id in existing if id not in amounts]
+        changed = []
+        for ingredient_id, row in existing.items():
+            amount = amounts.get(ingredient_id, row.amount)
+            if row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        added = [
+            RecipeIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        ]
+        if removed:
+            # post_delete удаленных строк отправляет
+            # recipe_ingredients_changed сам.
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        if added:
+            RecipeIngredient.objects.bulk_create(added)
+        if changed or added:
+            recipe_ingredients_changed.send(
+                sender=Recipe, recipe_id=recipe.pk, created=created
+            )
 
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('recipe_ingredients')
-        recipe = Recipe.objects.create(
-            author=self.context['request'].user,
-            **validated_data
-        )
-        recipe.tags.set(tags)
-        self.create_ingredients(recipe=recipe, ingredients=ingredients)
+        # Карточка рецепта строится один раз после фиксации транзакции,
+        # когда ингредиенты, созданные bulk_create, уже сохранены.
+        with transaction.atomic():
+            recipe = Recipe.objects.create(
+                author=self.context['request'].user,
+                **validated_data
+            )
+            recipe.tags.set(tags)
+            self.sync_ingredients(recipe, ingredients, created=True)
         return recipe
 
     def update(self, instance, validated_data):
-
-        if 'tags' not in validated_data:
-            instance.tags.clear()
-            instance.tags.set(validated_data.pop('tags'))
-
-        if 'recipe_ingredients' not in validated_data:
-            instance.ingredients.all.delete()
-            ingredients = validated_data.pop('recipe_ingredients')
-            self.create_ingredients(instance, ingredients)
-
-        return super().update(instance, validated_data)
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('recipe_ingredients', None)
+        with transaction.atomic():
+            if tags is not None:
+                instance.tags.set(tags)
+            if ingredients is not None:
+                self.sync_ingredients(instance, ingredients)
+            return super().update(instance, validated_data)
 
     def to_representation(self, instance):
         return RecipeReadSerializer(
@@ -355,6 +527,20 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         ).data
 
 
+class FollowListSerializer(serializers.ListSerializer):
+    """Сериализатор списка подписок.
+
+    Последние рецепты всех авторов страницы загружаются одним запросом.
+    """
+
+    def to_representation(self, data):
+        follows = list(data.all() if hasattr(data, 'all') else data)
+        self.context['recipes_by_author'] = self.child.get_recipes_by_author(
+            [follow.following_id for follow in follows]
+        )
+        return super().to_representation(follows)
+
+
 class FollowSerializer(serializers.ModelSerializer):
     """Сериализатор подписки."""
 
@@ -367,10 +553,11 @@ class FollowSerializer(serializers.ModelSerializer):
     recipes = serializers.SerializerMethodField(
         method_name='get_recipes',
     )
-    recipes_count = serializers.ReadOnlyField(source='following.recipes.count')
+    recipes_count = serializers.ReadOnlyField(source='following.recipes_count')
 
     class Meta:
         model = Follow
+        list_serializer_class = FollowListSerializer
         fields = (
             'id',
             'username',
@@ -383,18 +570,34 @@ class FollowSerializer(serializers.ModelSerializer):
         )
         read_only_fields = fields
 
-    def get_recipes(self, following):
-        request = self.context.get('request')
-        recipes_limit = int(
-            request.query_params['recipes_limit']
-            or 0
-        )
-        recipes = following.following.recipes.all()[:recipes_limit]
+    def get_recipes_limit(self):
+        try:
+            recipes_limit = int(
+                self.context['request'].query_params['recipes_limit']
+            )
+        except (KeyError, ValueError):
+            return None
+        return max(recipes_limit, 0)
+
+    def get_recipes_by_author(self, author_ids):
+        recipes_by_author = {author_id: [] for author_id in author_ids}
+        for recipe in Recipe.objects.latest_by_authors(
+            author_ids, self.get_recipes_limit()
+        ):
+            recipes_by_author[recipe.author_id].append(recipe)
+        return recipes_by_author
+
+    def get_recipes(self, follow):
+        recipes_by_author = self.context.get('recipes_by_author')
+        if recipes_by_author is None:
+            recipes_by_author = self.get_recipes_by_author(
+                [follow.following_id]
+            )
         serializer = RecipeInListSerializer(
-            recipes,
+            recipes_by_author[follow.following_id],
             many=True,
             read_only=True,
-            context={'request': request}
+            context={'request': self.context.get('request')}
         )
 
         return serializer.data
@@ -0,0 +1,186 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from api.cache import (bump_cart_versions, bump_content_generation,
+                       invalidate_tag_slugs)
+from api.cards import rebuild_cards
+from api.indexes import ingredient_index, recipe_ingredient_index
+from api.profiling import install_query_recorder
+from api.search import reindex_recipes
+from api.serializers import AuthorCardSerializer, UserSerializer
+from api.transactions import CommitBatch
+from recipes.images import renditions_built
+from recipes.models import Ingredient, Recipe, ShoppingCart, Tag
+from recipes.signals import (ingredients_imported, recipe_ingredients_changed,
+                             recipes_bulk_changed)
+from users.models import User
+
+connection_created.connect(install_query_recorder)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(ingredients_imported, sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag_map(**kwargs):
+    invalidate_tag_slugs()
+
+
+def bump_carts_on_commit(user_ids):
+    # Список пользователей читается сейчас, а версии сбрасываются после
+    # фиксации транзакции, иначе параллельная выгрузка списка покупок
+    # успеет закэшировать старые строки под новой версией.
+    user_ids = list(user_ids)
+    if user_ids:
+        transaction.on_commit(partial(bump_cart_versions, user_ids))
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def invalidate_cart(instance, **kwargs):
+    bump_carts_on_commit([instance.user_id])
+
+
+@receiver(recipes_bulk_changed, sender=ShoppingCart)
+def invalidate_cart_after_bulk_change(user_id, **kwargs):
+    bump_carts_on_commit([user_id])
+
+
+def bump_recipe_carts(recipe_ids):
+    bump_cart_versions(
+        ShoppingCart.objects.filter(recipe_id__in=recipe_ids)
+        .values_list('user_id', flat=True).distinct()
+    )
+
+
+# Сигнал приходит на каждую строку ингредиентов, поэтому корзины с
+# измененными рецептами ищутся одним запросом после фиксации транзакции.
+recipe_carts_invalidation = CommitBatch(bump_recipe_carts)
+
+
+@receiver(recipe_ingredients_changed, sender=Recipe)
+def invalidate_carts_after_ingredients_change(recipe_id, created, **kwargs):
+    if not created:
+        recipe_carts_invalidation.add([recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def invalidate_carts_with_ingredient(instance, created, update_fields,
+                                     **kwargs):
+    # Список покупок складывается по названию и единице измерения
+    # ингредиента, остальные поля рецепта и ингредиента на него не влияют.
+    if created or (
+        update_fields is not None
+        and not {'name', 'measurement_unit'} & set(update_fields)
+    ):
+        return
+    bump_carts_on_commit(
+        ShoppingCart.objects.filter(
+            recipe__recipe_ingredients__ingredient=instance
+        ).values_list('user_id', flat=True).distinct()
+    )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=User)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(ingredients_imported, sender=Ingredient)
+@receiver(renditions_built, sender=Recipe)
+@receiver(recipe_ingredients_changed, sender=Recipe)
+def invalidate_responses(**kwargs):
+    # Поколение меняется после фиксации транзакции, иначе параллельный
+    # запрос успеет закэшировать старые данные под новым поколением.
+    transaction.on_commit(bump_content_generation)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_responses(update_fields, **kwargs):
+    # Сохранение только неотображаемых полей, например last_login при
+    # входе, не сбрасывает кэш ответов.
+    if update_fields is not None and not (
+        set(update_fields) & set(UserSerializer.Meta.fields)
+    ):
+        return
+    invalidate_responses()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(renditions_built, sender=Recipe)
+@receiver(recipe_ingredients_changed, sender=Recipe)
+def rebuild_recipe_card(instance=None, recipe_id=None, **kwargs):
+    rebuild_cards([instance.pk if instance is not None else recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def rebuild_card_tags(instance, action, reverse, pk_set, **kwargs):
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        rebuild_cards([instance.pk])
+    elif reverse and action in ('post_add', 'post_remove'):
+        rebuild_cards(pk_set)
+    elif reverse and action == 'pre_clear':
+        rebuild_cards(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def rebuild_tag_cards(instance, **kwargs):
+    rebuild_cards(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Ingredient)
+def rebuild_ingredient_cards(instance, created, **kwargs):
+    if not created:
+        rebuild_cards(
+            instance.recipe_ingredients.values_list('recipe_id', flat=True)
+        )
+
+
+@receiver(post_save, sender=User)
+def rebuild_author_cards(instance, created, update_fields, **kwargs):
+    if created or (
+        update_fields is not None
+        and not set(update_fields) & set(AuthorCardSerializer.Meta.fields)
+    ):
+        return
+    rebuild_cards(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def reindex_recipe(instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {'name', 'text'} & update_fields:
+        return
+    reindex_recipes([instance.pk])
+
+
+@receiver(recipe_ingredients_changed, sender=Recipe)
+def reindex_recipe_ingredients(recipe_id, **kwargs):
+    reindex_recipes([recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_ingredient_recipes(instance, created, **kwargs):
+    if not created:
+        reindex_recipes(
+            instance.recipe_ingredients.values_list('recipe_id', flat=True)
+        )
+
+
+@receiver(recipe_ingredients_changed, sender=Recipe)
+def update_recipe_ingredient_index(recipe_id, **kwargs):
+    recipe_ingredient_index.change([recipe_id])
@@ -0,0 +1,34 @@
+import threading
+
+from django.db import transaction
+
+
+class CommitBatch:
+    """Ключи, накопленные за транзакцию, для обработки после фиксации.
+
+    Ключи копятся в наборе текущего потока, и каждое добавление ставит в
+    on_commit сброс набора: первый сброс после фиксации обрабатывает все
+    ключи транзакции разом, остальные находят набор пустым. Ключи
+    откаченной транзакции обрабатываются со следующей фиксацией, поэтому
+    handle должен быть повторяемым.
+    """
+
+    def __init__(self, handle):
+        self.handle = handle
+        self._local = threading.local()
+
+    def add(self, keys):
+        keys = set(keys)
+        if not keys:
+            return
+        pending = getattr(self._local, 'keys', None)
+        if pending is None:
+            pending = self._local.keys = set()
+        pending |= keys
+        transaction.on_commit(self.flush)
+
+    def flush(self):
+        keys = getattr(self._local, 'keys', None)
+        if keys:
+            self._local.keys = set()
+            self.handle(keys)
@@ -1,6 +1,11 @@
-from django.urls import include, path
+from functools import partial
+
+from django.conf import settings
+from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 
+from .async_views import (as_async_view, cache_response, load_recipe,
+                          load_recipes, run_action)
 from .views import (IngredientsViewSet, RecipeViewSet, TagViewSet, UserViewSet,
                     login, logout)
 
@@ -17,3 +22,56 @@ urlpatterns = [
     path('auth/token/login/', login, name='login'),
     path('auth/token/logout/', logout, name='logout'),
 ]
+
+if settings.ASYNC_READ_API:
+    # Маршруты чтения раньше маршрутов роутера, остальные методы этих
+    # адресов асинхронные представления передают синхронным.
+    urlpatterns = [
+        re_path(
+            r'^tags/$',
+            as_async_view(TagViewSet, {'get': 'list'}, run_action),
+            name='tags-list',
+        ),
+        re_path(
+            r'^tags/(?P<pk>[^/.]+)/$',
+            as_async_view(TagViewSet, {'get': 'retrieve'}, run_action),
+            name='tags-detail',
+        ),
+        re_path(
+            r'^ingredients/$',
+            as_async_view(IngredientsViewSet, {'get': 'list'}, run_action),
+            name='ingredients-list',
+        ),
+        re_path(
+            r'^ingredients/(?P<pk>[^/.]+)/$',
+            as_async_view(
+                IngredientsViewSet, {'get': 'retrieve'}, run_action
+            ),
+            name='ingredients-detail',
+        ),
+        re_path(
+            r'^recipes/$',
+            as_async_view(
+                RecipeViewSet,
+                {'get': 'list', 'post': 'create'},
+                partial(cache_response, load_recipes),
+            ),
+            name='recipes-list',
+        ),
+        # Только числовые id: остальные адреса вида recipes/<имя>/ -
+        # действия роутера (can_cook, download_shopping_cart и т.д.).
+        re_path(
+            r'^recipes/(?P<id>[0-9]+)/$',
+            as_async_view(
+                RecipeViewSet,
+                {
+                    'get': 'retrieve',
+                    'put': 'update',
+                    'patch': 'partial_update',
+                    'delete': 'destroy',
+                },
+                partial(cache_response, load_recipe),
+            ),
+            name='recipes-detail',
+        ),
+    ] + urlpatterns
@@ -1,17 +1,99 @@
 import base64
+import binascii
+import tempfile
 
-from django.core.files.base import ContentFile
+import filetype
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files import File
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+DECODE_CHUNK_SIZE = 64 * 1024
+SIGNATURE_SIZE = 8192
+IMAGE_MIME_TYPES = ('image/jpeg', 'image/png', 'image/gif', 'image/webp')
 
 
 class Base64ImageField(serializers.ImageField):
-    """Класс для преобразования картинки."""
+    """Класс для преобразования картинки.
+
+    Base64 декодируется частями во временный файл, тип изображения
+    определяется по содержимому, а не по заголовку data URI.
+    """
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            _, imgstr = data.split(';base64,')
+            file = tempfile.SpooledTemporaryFile(
+                max_size=settings.IMAGE_UPLOAD_SPOOL_SIZE
+            )
+            try:
+                for start in range(0, len(imgstr), DECODE_CHUNK_SIZE):
+                    file.write(base64.b64decode(
+                        imgstr[start:start + DECODE_CHUNK_SIZE]
+                    ))
+            except binascii.Error:
+                self.fail('invalid_image')
+            file.seek(0)
+            kind = filetype.guess(file.read(SIGNATURE_SIZE))
+            if kind is None or kind.mime not in IMAGE_MIME_TYPES:
+                self.fail('invalid_image')
+            file.seek(0)
+            data = File(file, name=f'image.{kind.extension}')
 
         return super().to_internal_value(data)
+
+
+class RenditionImageField(serializers.ImageField):
+    """Ссылка на уменьшенную копию изображения рецепта.
+
+    Пока копия не готова, отдается ссылка на оригинал.
+    """
+
+    def __init__(self, rendition, **kwargs):
+        self.rendition = rendition
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        return super().to_representation(
+            getattr(recipe, f'image_{self.rendition}') or recipe.image
+        )
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """Список первичных ключей, которые проверяются одним запросом IN."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        relation = self.child_relation
+        queryset = relation.get_queryset()
+        pks = []
+        for pk in data:
+            if isinstance(pk, bool):
+                relation.fail('incorrect_type', data_type=type(pk).__name__)
+            try:
+                pks.append(queryset.model._meta.pk.to_python(pk))
+            except DjangoValidationError:
+                relation.fail('incorrect_type', data_type=type(pk).__name__)
+        objects = queryset.in_bulk(pks)
+        for pk in pks:
+            if pk not in objects:
+                relation.fail('does_not_exist', pk_value=pk)
+        return [objects[pk] for pk in pks]
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField, для many=True загружающий объекты разом."""
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
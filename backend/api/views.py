@@ -1,26 +1,42 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db.models import Sum
-from django.http import HttpResponse
+from django.http import (Http404, HttpResponse, HttpResponseNotModified,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
 from rest_framework import filters, permissions, status, viewsets
 from rest_framework.authtoken.models import Token
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 
+from api.cache import cache_cart_rows, get_cart_rows, get_cart_version
+from api.exporters import EXPORTERS, SHOPPING_LIST_RENDERERS
 from api.filters import IngredientFilter, RecipeFilter
-from api.mixins import AddDeleteMixin, ListCreateRetrieveViewSet
-from api.paginators import IngredientPagination, RecipesPagination
-from api.serializers import (ChangePasswordSerializer, FollowSerializer,
-                             IngredientSerializer, RecipeInListSerializer,
-                             RecipeReadSerializer, RecipeWriteSerializer,
-                             TagSerializer, UserLoginSerializer,
-                             UserRegistrationSerializer, UserSerializer)
+from api.indexes import ingredient_index, recipe_ingredient_index
+from api.mixins import (AddDeleteMixin, ListCreateRetrieveViewSet,
+                        ProfileRequestMixin, ResponseCacheMixin)
+from api.paginators import (IngredientPagination, RecipesPagination,
+                            UsersPagination)
+from api.profiling import export_metrics
+from api.serializers import (CanCookSerializer, ChangePasswordSerializer,
+                             FollowSerializer, IngredientSerializer,
+                             RecipeInListSerializer, RecipeReadSerializer,
+                             RecipeWriteSerializer, TagSerializer,
+                             UserLoginSerializer, UserRegistrationSerializer,
+                             UserSerializer)
 from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.recommendations import recommend
 from users.models import User
 from users.permissions import AuthorOrRead
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(
+    ProfileRequestMixin,
+    ResponseCacheMixin,
+    viewsets.ReadOnlyModelViewSet,
+):
     """VieSet для тегов."""
 
     serializer_class = TagSerializer
@@ -28,19 +44,57 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = IngredientPagination
 
 
-class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientsViewSet(
+    ProfileRequestMixin,
+    ResponseCacheMixin,
+    viewsets.ReadOnlyModelViewSet,
+):
     """ViewSet для ингредиентов."""
 
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
     filter_backends = (IngredientFilter,)
-    search_fields = ('^name',)
     pagination_class = IngredientPagination
 
+    def list(self, request, *args, **kwargs):
+        term = IngredientFilter.get_term(request)
+        if not term or IngredientFilter.searches_database():
+            return super().list(request, *args, **kwargs)
+        return self.get_cached_response(self.list_from_index, request, term)
 
-class RecipeViewSet(AddDeleteMixin, viewsets.ModelViewSet):
+    def list_from_index(self, request, term):
+        """Поиск по индексу в памяти, из базы читается только страница.
+
+        Совпадения ищутся только до конца запрошенной страницы.
+        """
+
+        page_size = self.paginator.get_page_size(request)
+        try:
+            number = int(request.query_params.get(
+                self.paginator.page_query_param, 1
+            ))
+        except ValueError:
+            number = 1
+        page = self.paginate_queryset(
+            ingredient_index.search(term, page_size * max(number, 1))
+        )
+        ingredients = Ingredient.objects.in_bulk(page)
+        serializer = self.get_serializer(
+            [ingredients[pk] for pk in page if pk in ingredients], many=True
+        )
+        return self.get_paginated_response(serializer.data)
+
+
+class RecipeViewSet(
+    ProfileRequestMixin,
+    AddDeleteMixin,
+    ResponseCacheMixin,
+    viewsets.ModelViewSet,
+):
     """ViewSet для рецептов."""
 
+    cache_anonymous_only = True
+
     queryset = Recipe.objects.all()
     lookup_field = 'id'
     permission_classes = (AuthorOrRead,)
@@ -48,6 +102,11 @@ class RecipeViewSet(AddDeleteMixin, viewsets.ModelViewSet):
     pagination_class = RecipesPagination
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        if self.request.method in permissions.SAFE_METHODS:
+            return Recipe.objects.for_read(self.request.user)
+        return super().get_queryset()
+
     def get_serializer_class(self):
         return (
             RecipeReadSerializer
@@ -68,6 +127,20 @@ class RecipeViewSet(AddDeleteMixin, viewsets.ModelViewSet):
     def delete_favorite(self, request, id):
         return self.delete_relation(id, 'favorite')
 
+    @action(
+        methods=['post'],
+        detail=False,
+        url_path='favorite',
+        url_name='favorites',
+        permission_classes=(permissions.IsAuthenticated,)
+    )
+    def user_favorites(self, request):
+        return self.add_relations('favorite')
+
+    @user_favorites.mapping.delete
+    def delete_favorites(self, request):
+        return self.delete_relations('favorite')
+
     @action(
         methods=['post'],
         detail=True,
@@ -82,43 +155,152 @@ class RecipeViewSet(AddDeleteMixin, viewsets.ModelViewSet):
         return self.delete_relation(id, 'cart')
 
     @action(
-        methods=['get'],
+        methods=['post'],
         detail=False,
-        url_path='download_shopping_cart',
+        url_path='shopping_cart',
+        url_name='shopping-carts',
         permission_classes=(permissions.IsAuthenticated,)
     )
-    def download_cart(self, request):
-        cart = (
-            RecipeIngredient.objects
-            .filter(recipe__carts__user=request.user)
-            .order_by('ingredient__name')
-            .values('ingredient__name', 'ingredient__measurement_unit')
-            .annotate(amount=Sum('amount'))
+    def user_carts(self, request):
+        return self.add_relations('cart')
+
+    @user_carts.mapping.delete
+    def delete_carts(self, request):
+        return self.delete_relations('cart')
+
+    @action(
+        methods=['get'],
+        detail=False,
+        url_path='can_cook',
+        url_name='can-cook',
+    )
+    def can_cook(self, request):
+        """Рецепты по убыванию доли ингредиентов, которые есть у пользователя.
+
+        Подбор идет по индексу ингредиентов рецептов в памяти, из базы
+        читается только страница рецептов.
+        """
+
+        params = CanCookSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        page = self.paginate_queryset(recipe_ingredient_index.match(
+            params.validated_data['ingredients'],
+            params.validated_data['min_coverage'],
+        ))
+        recipes = Recipe.objects.for_read(request.user).in_bulk(
+            [recipe_id for _, _, recipe_id in page]
         )
-        content = '\n'.join(
-            [
-                (
-                    f'{ol}. {ingredient["ingredient__name"]} '
-                    f'{ingredient["amount"]} '
-                    f'{ingredient["ingredient__measurement_unit"]}'
-                ) for ol, ingredient in enumerate(list(cart), start=1)
+        page = [
+            (recipes[recipe_id], coverage)
+            for coverage, _, recipe_id in page if recipe_id in recipes
+        ]
+        data = RecipeReadSerializer(
+            [recipe for recipe, _ in page],
+            many=True,
+            context=self.get_serializer_context(),
+        ).data
+        for item, (_, coverage) in zip(data, page):
+            item['coverage'] = coverage
+        return self.get_paginated_response(data)
+
+    @action(
+        methods=['get'],
+        detail=False,
+        url_path='recommended',
+        permission_classes=(permissions.IsAuthenticated,)
+    )
+    def recommended(self, request):
+        """Рецепты, похожие на избранное и корзину пользователя.
+
+        Похожие рецепты читаются из таблицы, построенной командой
+        build_recommendations. Пока рекомендаций нет, отдаются популярные
+        рецепты других авторов, которых нет в избранном и корзине.
+        """
+
+        recipe_ids = recommend(request.user)
+        if not recipe_ids:
+            page = self.paginate_queryset(
+                Recipe.objects.for_read(request.user)
+                .exclude(author=request.user)
+                .filter(is_favorited=False, is_in_shopping_cart=False)
+                .order_by('-favorites_count', '-pub_date', '-id')
+            )
+        else:
+            page = self.paginate_queryset(recipe_ids)
+            recipes = Recipe.objects.for_read(request.user).in_bulk(page)
+            page = [
+                recipes[recipe_id] for recipe_id in page
+                if recipe_id in recipes
             ]
+        serializer = RecipeReadSerializer(
+            page, many=True, context=self.get_serializer_context()
         )
-        response = HttpResponse(content, content_type='text/plain')
-        response['Content-Disposition'] = (
-            'attachment; filename=shopping-list.txt'
-        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        methods=['get'],
+        detail=False,
+        url_path='download_shopping_cart',
+        permission_classes=(permissions.IsAuthenticated,),
+        renderer_classes=SHOPPING_LIST_RENDERERS,
+    )
+    def download_cart(self, request):
+        user_id = request.user.id
+        renderer = request.accepted_renderer
+        version = get_cart_version(user_id)
+        etag = quote_etag(f'{version}-{renderer.format}')
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            rows = get_cart_rows(user_id, version)
+            if rows is None:
+                cart = (
+                    RecipeIngredient.objects
+                    .filter(recipe__carts__user_id=user_id)
+                    .order_by('ingredient__name')
+                    .values('ingredient__name', 'ingredient__measurement_unit')
+                    .annotate(amount=Sum('amount'))
+                    .values_list(
+                        'ingredient__name',
+                        'ingredient__measurement_unit',
+                        'amount',
+                    )
+                )
+                rows = cache_cart_rows(cart.iterator(), user_id, version)
+            content_type = renderer.media_type
+            if renderer.charset:
+                content_type += f'; charset={renderer.charset}'
+            response = StreamingHttpResponse(
+                EXPORTERS[renderer.format](rows),
+                content_type=content_type,
+            )
+            response['Content-Disposition'] = (
+                f'attachment; filename=shopping-list.{renderer.format}'
+            )
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        patch_vary_headers(response, ('Accept', 'Authorization'))
         return response
 
 
-class UserViewSet(AddDeleteMixin, ListCreateRetrieveViewSet):
+class UserViewSet(
+    ProfileRequestMixin,
+    AddDeleteMixin,
+    ListCreateRetrieveViewSet,
+):
     """ViewSet для работы с пользователями."""
 
     queryset = User.objects.all()
     serializer_class = UserSerializer
     filter_backends = (filters.SearchFilter,)
-    search_fields = ('username',)
-    pagination_class = RecipesPagination
+    # Поиск по началу имени идет по индексу UPPER(username).
+    search_fields = ('^username',)
+    pagination_class = UsersPagination
+
+    def get_queryset(self):
+        if self.request.method in permissions.SAFE_METHODS:
+            return User.objects.with_is_subscribed(self.request.user)
+        return super().get_queryset()
 
     @action(
         methods=['get'],
@@ -138,8 +320,11 @@ class UserViewSet(AddDeleteMixin, ListCreateRetrieveViewSet):
         permission_classes=(permissions.IsAuthenticated,)
     )
     def user_subscriptions(self, request):
-        user = request.user
-        following = user.follower.all()
+        following = (
+            request.user.follower
+            .select_related('following')
+            .order_by('-id')
+        )
         serializer = FollowSerializer(
             self.paginate_queryset(following), many=True,
             context={'request': request}
@@ -228,3 +413,13 @@ def logout(request):
         return Response(status=status.HTTP_204_NO_CONTENT)
     except Exception as error:
         return Response(str(error), status=status.HTTP_400_BAD_REQUEST)
+
+
+def metrics(request):
+    """Метрики представлений в формате Prometheus для внутренних адресов."""
+
+    if request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS:
+        raise Http404
+    return HttpResponse(
+        export_metrics(), content_type='text/plain; version=0.0.4'
+    )
@@ -34,6 +34,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.profiling.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -42,6 +43,40 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Адреса, с которых доступны метрики /internal/metrics/.
+INTERNAL_IPS = os.getenv('INTERNAL_IPS', '127.0.0.1').split(' ')
+
+# Сбор метрик по представлениям добавляет работу каждому запросу, поэтому
+# по умолчанию выключен.
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=False, cast=bool)
+
+# Заголовок Server-Timing раскрывает время работы сервера, поэтому по
+# умолчанию он включен только в режиме отладки.
+PROFILING_SERVER_TIMING = config(
+    'PROFILING_SERVER_TIMING', default=DEBUG, cast=bool
+)
+
+# Запросы к базе дольше этого порога записываются в лог api.profiling.
+SLOW_QUERY_MS = 100
+
+# Профили запросов сотрудников с заголовком X-Profile или параметром
+# profile хранятся на диске, старые удаляются сверх PROFILES_MAX.
+PROFILES_ROOT = os.getenv('PROFILES_ROOT', os.path.join(BASE_DIR, 'profiles'))
+
+PROFILES_MAX = 50
+
+PROFILING_SAMPLE_INTERVAL = 0.001
+
+# Асинхронные представления чтения тегов, ингредиентов и рецептов для
+# запуска под ASGI. Запросы к базе выполняются в отдельном пуле потоков.
+ASYNC_READ_API = config('ASYNC_READ_API', default=False, cast=bool)
+
+ASYNC_DB_WORKERS = int(os.getenv('ASYNC_DB_WORKERS', 8))
+
+# Время жизни соединений потоков пула, секунды. Потоков не больше
+# ASYNC_DB_WORKERS на процесс, поэтому соединения не копятся.
+ASYNC_DB_CONN_MAX_AGE = int(os.getenv('ASYNC_DB_CONN_MAX_AGE', 60))
+
 ROOT_URLCONF = 'foodgram_backend.urls'
 
 TEMPLATES = [
@@ -114,17 +149,48 @@ MEDIA_ROOT = '/media'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'emails')
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+API_CACHE_ALIAS = os.getenv('API_CACHE_ALIAS', 'default')
+
+API_CACHE_TIMEOUT = 10 * 60
+
+# Снимки пользователей по токену: LRU в памяти процесса и, если задан
+# AUTH_TOKEN_CACHE_ALIAS, общий кэш. Выход и смена пароля сбрасывают обе
+# записи, другие процессы видят изменения не позже AUTH_TOKEN_CACHE_TIMEOUT.
+AUTH_TOKEN_CACHE_ALIAS = os.getenv('AUTH_TOKEN_CACHE_ALIAS')
+
+AUTH_TOKEN_CACHE_SIZE = 10000
+
+AUTH_TOKEN_CACHE_TIMEOUT = 60
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
     'DEFAULT_FILTER_BACKENDS': [
@@ -162,4 +228,61 @@ MAX_COOKING_TIME = 300
 
 MIN_VALUE = 1
 
+# Наибольшее число рецептов в пакетном добавлении в избранное и корзину.
+BATCH_MAX_RECIPES = 100
+
+# Наибольшее число ингредиентов в подборе рецептов по продуктам.
+CAN_COOK_MAX_INGREDIENTS = 100
+
+# Рекомендации: число похожих рецептов, хранимых для каждого рецепта,
+# вес рецепта в корзине относительно избранного, число последних
+# рецептов пользователя, по которым подбираются рекомендации, и добавка
+# к оценке рецептов авторов, на которых пользователь подписан.
+RECOMMENDATIONS_NEIGHBOURS = 20
+RECOMMENDATIONS_CART_WEIGHT = 0.5
+RECOMMENDATIONS_SEEDS = 100
+RECOMMENDATIONS_FOLLOW_BOOST = 0.5
+
 MAX_VALUE = 32000
+
+# Режим поиска ингредиентов: auto - индексы PostgreSQL при наличии pg_trgm,
+# иначе индекс в памяти; database - только база; memory - только память.
+INGREDIENT_SEARCH_MODE = os.getenv('INGREDIENT_SEARCH_MODE', 'auto')
+
+# Режим полнотекстового поиска рецептов: auto - поисковый вектор в
+# PostgreSQL, иначе индекс в памяти; database - только база; memory -
+# только память.
+RECIPE_SEARCH_MODE = os.getenv('RECIPE_SEARCH_MODE', 'auto')
+
+# Конфигурация текстового поиска PostgreSQL для поискового вектора.
+RECIPE_SEARCH_CONFIG = os.getenv('RECIPE_SEARCH_CONFIG', 'russian')
+
+# Подсчет строк для пагинации без фильтров: exact - COUNT(*) на каждый
+# запрос, cached - COUNT(*) кэшируется до изменения данных, approximate -
+# оценка из статистики PostgreSQL для таблиц от APPROXIMATE_COUNT_MIN строк.
+PAGINATION_COUNT_MODE = os.getenv('PAGINATION_COUNT_MODE', 'cached')
+
+APPROXIMATE_COUNT_MIN = 100000
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+)
+
+SHOPPING_LIST_PDF_SPOOL_SIZE = 1024 * 1024
+
+SHOPPING_CART_CACHE_TIMEOUT = 60 * 60
+
+SHOPPING_CART_CACHE_MAX_ROWS = 5000
+
+IMAGE_UPLOAD_SPOOL_SIZE = 1024 * 1024
+
+# Размеры уменьшенных копий изображений рецептов.
+IMAGE_RENDITIONS = {
+    'thumbnail': (320, 320),
+    'medium': (960, 960),
+}
+
+IMAGE_QUALITY = 80
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
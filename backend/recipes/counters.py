@@ -0,0 +1,82 @@
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+pending = threading.local()
+
+
+def count_subquery(model, field):
+    """Подзапрос количества строк model, ссылающихся на внешний объект."""
+
+    return Coalesce(
+        Subquery(
+            model.objects
+            .filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        Value(0),
+    )
+
+
+def recount(recipe_model, user_model, favorite_model, follow_model):
+    """Пересчитывает все счетчики по фактическим данным."""
+
+    recipe_model.objects.update(
+        favorites_count=count_subquery(favorite_model, 'recipe')
+    )
+    user_model.objects.update(
+        recipes_count=count_subquery(recipe_model, 'author'),
+        followers_count=count_subquery(follow_model, 'following'),
+    )
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно изменяет счетчик на delta, не опускаясь ниже нуля.
+
+    Внутри batch_counter_changes изменение откладывается до конца блока.
+    """
+
+    changes = getattr(pending, 'changes', None)
+    if changes is not None:
+        changes[model, field][pk] += delta
+        return
+    change_counters(model, [pk], field, delta)
+
+
+def change_counters(model, pks, field, delta):
+    """Изменяет счетчик сразу у нескольких объектов одним запросом."""
+
+    model.objects.filter(pk__in=pks).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+@contextmanager
+def batch_counter_changes():
+    """Копит изменения счетчиков из сигналов отдельных строк.
+
+    После блока счетчики обновляются одним запросом на каждое значение
+    изменения, а не запросом на каждую строку.
+    """
+
+    if getattr(pending, 'changes', None) is not None:
+        yield
+        return
+    changes = pending.changes = defaultdict(Counter)
+    try:
+        yield
+    finally:
+        pending.changes = None
+    for (model, field), deltas in changes.items():
+        pks_by_delta = defaultdict(list)
+        for pk, delta in deltas.items():
+            if delta:
+                pks_by_delta[delta].append(pk)
+        for delta, pks in pks_by_delta.items():
+            change_counters(model, pks, field, delta)
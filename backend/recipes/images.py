@@ -0,0 +1,96 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.dispatch import Signal
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_DIR = 'recipes/images/renditions'
+
+# Отправляется после сохранения ссылок на копии изображения рецепта.
+renditions_built = Signal()
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_WORKERS,
+    thread_name_prefix='image-renditions',
+)
+
+
+def get_rendition_format():
+    if features.check('webp'):
+        return 'WEBP', 'webp'
+    return 'JPEG', 'jpg'
+
+
+def get_rendition_name(source_name, rendition):
+    """Имя копии однозначно выводится из имени оригинала."""
+
+    _, extension = get_rendition_format()
+    source = PurePosixPath(source_name).name.replace('.', '_')
+    return f'{RENDITIONS_DIR}/{source}_{rendition}.{extension}'
+
+
+def renditions_are_stale(recipe):
+    return bool(recipe.image) and any(
+        getattr(recipe, f'image_{rendition}').name
+        != get_rendition_name(recipe.image.name, rendition)
+        for rendition in settings.IMAGE_RENDITIONS
+    )
+
+
+def build_renditions(recipe_id, source_name):
+    """Создает уменьшенные копии изображения и сохраняет ссылки на них."""
+
+    from recipes.models import Recipe
+
+    image_format, _ = get_rendition_format()
+    fields = {}
+    with default_storage.open(source_name) as source:
+        original = ImageOps.exif_transpose(Image.open(source))
+        if image_format == 'JPEG' or original.mode not in ('RGB', 'RGBA'):
+            original = original.convert('RGB')
+        for rendition, size in settings.IMAGE_RENDITIONS.items():
+            image = original.copy()
+            image.thumbnail(size, Image.LANCZOS)
+            buffer = BytesIO()
+            image.save(
+                buffer, image_format, quality=settings.IMAGE_QUALITY
+            )
+            name = get_rendition_name(source_name, rendition)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            fields[f'image_{rendition}'] = default_storage.save(
+                name, ContentFile(buffer.getvalue())
+            )
+    if Recipe.objects.filter(pk=recipe_id, image=source_name).update(
+        **fields
+    ):
+        renditions_built.send(sender=Recipe, recipe_id=recipe_id)
+
+
+def run_build_renditions(recipe_id, source_name):
+    close_old_connections()
+    try:
+        build_renditions(recipe_id, source_name)
+    except Exception:
+        logger.exception(
+            'Не удалось создать копии изображения %s', source_name
+        )
+    finally:
+        close_old_connections()
+
+
+def schedule_renditions(recipe):
+    """Ставит создание копий в очередь после фиксации транзакции."""
+
+    recipe_id, source_name = recipe.pk, recipe.image.name
+    transaction.on_commit(
+        lambda: executor.submit(run_build_renditions, recipe_id, source_name)
+    )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from recipes.recommendations import build_recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит таблицу похожих рецептов по избранному и корзинам '
+        'пользователей.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help=(
+                'Пересчитать только рецепты пользователей с новыми '
+                'действиями после прошлого построения.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        build = build_recommendations(options['incremental'])
+        mode = 'инкрементально' if build.incremental else 'полностью'
+        self.stdout.write(self.style.SUCCESS(
+            f'Похожие рецепты построены {mode}: {build.recipes} рецептов.'
+        ))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import build_renditions, renditions_are_stale
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создает недостающие уменьшенные копии изображений рецептов.'
+
+    def handle(self, *args, **options):
+        built = 0
+        for recipe in Recipe.objects.exclude(image='').iterator():
+            if not renditions_are_stale(recipe):
+                continue
+            try:
+                build_renditions(recipe.pk, recipe.image.name)
+            except (OSError, ValueError) as error:
+                self.stderr.write(f'{recipe.image.name}: {error}')
+            else:
+                built += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Созданы копии изображений для {built} рецептов.'
+        ))
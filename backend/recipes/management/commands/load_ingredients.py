@@ -0,0 +1,166 @@
+import csv
+import io
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipes.models import Ingredient
+from recipes.signals import ingredients_imported
+
+DEFAULT_PATH = settings.BASE_DIR.parent / 'data' / 'ingredients.csv'
+READ_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    """Построчно читает пары (название, единица измерения) из CSV."""
+
+    for row in csv.reader(file):
+        if len(row) >= 2:
+            yield row[0], row[1]
+
+
+def read_json(file):
+    """Потоково читает массив объектов JSON, не загружая файл целиком."""
+
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    eof = False
+    while True:
+        buffer = buffer.lstrip()
+        if not started and buffer.startswith('['):
+            buffer = buffer[1:]
+            started = True
+            continue
+        if buffer.startswith(','):
+            buffer = buffer[1:]
+            continue
+        if buffer.startswith(']'):
+            return
+        if buffer:
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                buffer = buffer[end:]
+                yield item['name'], item['measurement_unit']
+                continue
+        if eof:
+            return
+        chunk = file.read(READ_SIZE)
+        eof = not chunk
+        buffer += chunk
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+def batched(rows, size):
+    """Разбивает поток строк на пачки без повторов внутри пачки."""
+
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield list(dict.fromkeys(
+            (name.strip(), unit.strip())
+            for name, unit in batch
+            if name.strip() and unit.strip()
+        ))
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает ингредиенты из CSV или JSON пачками, пропуская '
+        'уже существующие пары (название, единица измерения).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', default=[DEFAULT_PATH])
+        parser.add_argument(
+            '--format', choices=READERS,
+            help='Формат файла; по умолчанию определяется по расширению.'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Не использовать COPY даже на PostgreSQL.'
+        )
+
+    def handle(self, *args, **options):
+        use_copy = (
+            connection.vendor == 'postgresql' and not options['no_copy']
+        )
+        insert = self.copy_batch if use_copy else self.bulk_create_batch
+        for path in map(Path, options['paths']):
+            file_format = options['format'] or path.suffix.lstrip('.')
+            if file_format not in READERS:
+                raise CommandError(f'Неизвестный формат файла {path}.')
+            started = time.perf_counter()
+            read = created = 0
+            newline = '' if file_format == 'csv' else None
+            with open(path, encoding='utf-8', newline=newline) as file:
+                for batch in batched(
+                    READERS[file_format](file), options['batch_size']
+                ):
+                    with transaction.atomic():
+                        created += insert(batch)
+                    read += len(batch)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(
+                f'{path.name}: прочитано {read}, добавлено {created} '
+                f'за {elapsed:.2f} с ({read / max(elapsed, 1e-9):.0f} '
+                'строк/с).'
+            ))
+        ingredients_imported.send(sender=Ingredient)
+
+    @staticmethod
+    def bulk_create_batch(batch):
+        # Уже существующие пары пачки выбираются по индексу одним запросом,
+        # вместо подсчета всей таблицы до и после вставки.
+        existing = set(
+            Ingredient.objects.filter(
+                name__in={name for name, _ in batch}
+            ).values_list('name', 'measurement_unit')
+        )
+        new = [row for row in batch if row not in existing]
+        Ingredient.objects.bulk_create(
+            (
+                Ingredient(name=name, measurement_unit=unit)
+                for name, unit in new
+            ),
+            ignore_conflicts=True,
+        )
+        return len(new)
+
+    @staticmethod
+    def copy_batch(batch):
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_import '
+                '(name text, measurement_unit text) ON COMMIT DROP'
+            )
+            cursor.copy_expert(
+                'COPY ingredient_import FROM STDIN WITH (FORMAT csv)', buffer
+            )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT name, measurement_unit FROM ingredient_import '
+                'ON CONFLICT DO NOTHING'
+            )
+            return cursor.rowcount
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import recount
+from recipes.models import Favorite, Recipe
+from users.models import Follow, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счетчики избранного, рецептов и подписчиков '
+        'по фактическим данным.'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recount(Recipe, User, Favorite, Follow)
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны.'))
@@ -0,0 +1,51 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:20
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    duplicates = (
+        Ingredient.objects
+        .values('name', 'measurement_unit')
+        .annotate(keep_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for duplicate in duplicates:
+        extra_ids = list(
+            Ingredient.objects
+            .filter(
+                name=duplicate['name'],
+                measurement_unit=duplicate['measurement_unit'],
+            )
+            .exclude(id=duplicate['keep_id'])
+            .values_list('id', flat=True)
+        )
+        for extra_id in extra_ids:
+            RecipeIngredient.objects.filter(
+                ingredient_id=extra_id,
+                recipe__recipe_ingredients__ingredient_id=duplicate['keep_id'],
+            ).delete()
+            RecipeIngredient.objects.filter(
+                ingredient_id=extra_id,
+            ).update(ingredient_id=duplicate['keep_id'])
+        Ingredient.objects.filter(id__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='Ингредиент уже существует.'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+from django.db import DatabaseError, migrations, transaction
+
+PREFIX_INDEX = 'recipes_ingredient_name_upper_prefix'
+TRIGRAM_INDEX = 'recipes_ingredient_name_upper_trgm'
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {PREFIX_INDEX} '
+        'ON recipes_ingredient (UPPER(name::text) text_pattern_ops)'
+    )
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} '
+                'ON recipes_ingredient USING gin '
+                '(UPPER(name::text) gin_trgm_ops)'
+            )
+    except DatabaseError:
+        # Без прав на расширение pg_trgm поиск по подстроке выполняется
+        # по индексу в памяти процесса.
+        pass
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {TRIGRAM_INDEX}')
+    schema_editor.execute(f'DROP INDEX IF EXISTS {PREFIX_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_ingredient_unique_name_unit'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
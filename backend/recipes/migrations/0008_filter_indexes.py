@@ -0,0 +1,38 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:35
+
+from django.db import migrations, models
+
+# Автоматическая промежуточная таблица тегов индексируется только
+# по (recipe_id, tag_id), а фильтр по тегам идет от тега к рецептам.
+TAG_RECIPE_INDEX = 'recipes_recipe_tags_tag_recipe_idx'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_pub_date_id_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['recipe', 'user'], name='favorite_recipe_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipeingredient',
+            index=models.Index(fields=['ingredient', 'recipe'], name='recipeingredient_ingr_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingcart',
+            index=models.Index(fields=['recipe', 'user'], name='cart_recipe_user_idx'),
+        ),
+        migrations.RunSQL(
+            f'CREATE INDEX IF NOT EXISTS {TAG_RECIPE_INDEX} '
+            'ON recipes_recipe_tags (tag_id, recipe_id)',
+            f'DROP INDEX IF EXISTS {TAG_RECIPE_INDEX}',
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.3 on 2026-10-18 03:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationsBuild',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('built_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата и время построения')),
+                ('incremental', models.BooleanField(default=False, verbose_name='Инкрементальное')),
+                ('favorite_max_id', models.PositiveIntegerField(default=0, verbose_name='Последний id избранного')),
+                ('cart_max_id', models.PositiveIntegerField(default=0, verbose_name='Последний id корзины')),
+                ('recipes', models.PositiveIntegerField(default=0, verbose_name='Пересчитано рецептов')),
+            ],
+            options={
+                'verbose_name': 'Построение рекомендаций',
+                'verbose_name_plural': 'Построения рекомендаций',
+                'ordering': ('-id',),
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeSimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Сходство')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarities', to='recipes.recipe', verbose_name='Рецепт')),
+                ('similar_recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.recipe', verbose_name='Похожий рецепт')),
+            ],
+            options={
+                'verbose_name': 'Похожий рецепт',
+                'verbose_name_plural': 'Похожие рецепты',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='recipesimilarity',
+            constraint=models.UniqueConstraint(fields=('recipe', 'similar_recipe'), name='Похожий рецепт указан один раз.'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+PREFIX_INDEX = 'recipes_ingredient_name_upper_prefix'
+
+
+def drop_prefix_index(apps, schema_editor):
+    # Поиск ингредиентов идет по подстроке через триграммный индекс,
+    # индекс по началу названия ни одним запросом не используется.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {PREFIX_INDEX}')
+
+
+def create_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {PREFIX_INDEX} '
+        'ON recipes_ingredient (UPPER(name::text) text_pattern_ops)'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recommendations'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_prefix_index, create_prefix_index),
+    ]
@@ -1,8 +1,11 @@
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
 
-from users.models import User
+from users.models import Follow, User
 
 from .validators import validate_hex
 
@@ -52,11 +55,100 @@ class Ingredient(models.Model):
         ordering = ('name',)
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='Ингредиент уже существует.'
+            ),
+        )
 
     def __str__(self):
         return f'{self.name} - {self.measurement_unit}'
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Набор запросов рецептов."""
+
+    def with_user_flags(self, user):
+        """Аннотирует флаги избранного и корзины для пользователя."""
+
+        if user.is_anonymous:
+            false = models.Value(False, output_field=models.BooleanField())
+            return self.annotate(is_favorited=false, is_in_shopping_cart=false)
+        return self.annotate(
+            is_favorited=models.Exists(
+                Favorite.objects.filter(
+                    user=user, recipe=models.OuterRef('pk')
+                )
+            ),
+            is_in_shopping_cart=models.Exists(
+                ShoppingCart.objects.filter(
+                    user=user, recipe=models.OuterRef('pk')
+                )
+            ),
+        )
+
+    def for_read(self, user):
+        """Выборка для чтения рецептов через карточки одним запросом.
+
+        К готовой карточке рецепта добавляются флаги избранного, корзины
+        и подписки на автора для пользователя.
+        """
+
+        if user.is_anonymous:
+            is_subscribed = models.Value(
+                False, output_field=models.BooleanField()
+            )
+        else:
+            is_subscribed = models.Exists(
+                Follow.objects.filter(
+                    user=user, following=models.OuterRef('author_id')
+                )
+            )
+        return self.with_user_flags(user).select_related('card').defer(
+            'search_vector'
+        ).annotate(author_is_subscribed=is_subscribed)
+
+    def for_card(self):
+        """Выборка для построения карточек рецептов."""
+
+        return self.select_related('author').prefetch_related(
+            'tags',
+            models.Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ).order_by('ingredient__name'),
+            ),
+        )
+
+    def latest_by_authors(self, author_ids, limit=None):
+        """Последние limit рецептов каждого автора одним запросом.
+
+        Рецепты нумеруются оконной функцией ROW_NUMBER() в пределах
+        автора, внешний запрос оставляет первые limit номеров.
+        """
+
+        queryset = self.filter(author_id__in=author_ids)
+        if limit is not None:
+            ranked = queryset.annotate(
+                row_number=models.Window(
+                    RowNumber(),
+                    partition_by=models.F('author_id'),
+                    order_by=(
+                        models.F('pub_date').desc(),
+                        models.F('id').desc(),
+                    ),
+                )
+            ).order_by().values('id', 'row_number')
+            sql, params = ranked.query.sql_with_params()
+            queryset = self.filter(id__in=RawSQL(
+                f'SELECT id FROM ({sql}) ranked WHERE row_number <= %s',
+                (*params, limit),
+            ))
+        return queryset.order_by('-pub_date', '-id')
+
+
 class Recipe(models.Model):
     """Модель рецептов."""
 
@@ -74,6 +166,18 @@ class Recipe(models.Model):
         verbose_name='Изображение',
         upload_to='recipes/images/',
     )
+    image_thumbnail = models.ImageField(
+        verbose_name='Миниатюра изображения',
+        upload_to='recipes/images/renditions/',
+        blank=True,
+        editable=False,
+    )
+    image_medium = models.ImageField(
+        verbose_name='Изображение среднего размера',
+        upload_to='recipes/images/renditions/',
+        blank=True,
+        editable=False,
+    )
     text = models.TextField(
         verbose_name='Описание',
     )
@@ -107,9 +211,31 @@ class Recipe(models.Model):
         verbose_name='Дата и время публикации рецепта',
         auto_now_add=True,
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='Добавлено в избранное',
+        default=0,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_idx',
+            ),
+        )
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -157,6 +283,12 @@ class RecipeIngredient(models.Model):
                 name='Ингредиенты уникальны.'
             )
         ]
+        indexes = (
+            models.Index(
+                fields=('ingredient', 'recipe'),
+                name='recipeingredient_ingr_idx',
+            ),
+        )
 
     def __str__(self):
         return (
@@ -166,6 +298,105 @@ class RecipeIngredient(models.Model):
         )
 
 
+class RecipeCard(models.Model):
+    """Готовое представление рецепта без данных пользователя.
+
+    Хранится текстом JSON, так как jsonb не сохраняет порядок ключей.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='card',
+    )
+    data = models.TextField(
+        verbose_name='Данные',
+    )
+
+    class Meta:
+        verbose_name = 'Карточка рецепта'
+        verbose_name_plural = 'Карточки рецептов'
+
+    def __str__(self):
+        return str(self.recipe_id)
+
+
+class RecipeSimilarity(models.Model):
+    """Похожий рецепт по совместному добавлению в избранное и корзину.
+
+    Для каждого рецепта хранятся RECOMMENDATIONS_NEIGHBOURS самых похожих
+    рецептов, строятся командой build_recommendations.
+    """
+
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        related_name='similarities',
+    )
+    similar_recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Похожий рецепт',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    score = models.FloatField(
+        verbose_name='Сходство',
+    )
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'similar_recipe'),
+                name='Похожий рецепт указан один раз.'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe_id} ~ {self.similar_recipe_id}: {self.score}'
+
+
+class RecommendationsBuild(models.Model):
+    """Построение таблицы похожих рецептов.
+
+    Наибольшие id избранного и корзины на момент построения - граница,
+    после которой действия пользователей учитывает инкрементальный режим.
+    """
+
+    built_at = models.DateTimeField(
+        verbose_name='Дата и время построения',
+        auto_now_add=True,
+    )
+    incremental = models.BooleanField(
+        verbose_name='Инкрементальное',
+        default=False,
+    )
+    favorite_max_id = models.PositiveIntegerField(
+        verbose_name='Последний id избранного',
+        default=0,
+    )
+    cart_max_id = models.PositiveIntegerField(
+        verbose_name='Последний id корзины',
+        default=0,
+    )
+    recipes = models.PositiveIntegerField(
+        verbose_name='Пересчитано рецептов',
+        default=0,
+    )
+
+    class Meta:
+        ordering = ('-id',)
+        verbose_name = 'Построение рекомендаций'
+        verbose_name_plural = 'Построения рекомендаций'
+
+    def __str__(self):
+        return f'{self.built_at}: {self.recipes}'
+
+
 class AbstractFavoriteCart(models.Model):
     """Абстрактная модель для избранного."""
 
@@ -198,6 +429,12 @@ class Favorite(AbstractFavoriteCart):
                 name='Рецепт уже в избранном.'
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('recipe', 'user'),
+                name='favorite_recipe_user_idx',
+            ),
+        )
 
     def __str__(self):
         return f'{self.user} добавил в избранное {self.recipe}'
@@ -217,6 +454,12 @@ class ShoppingCart(AbstractFavoriteCart):
                 name='Рецепт уже в корзине.'
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('recipe', 'user'),
+                name='cart_recipe_user_idx',
+            ),
+        )
 
     def __str__(self):
         return f'{self.user.username} добавил в корзину {self.recipe.name}'
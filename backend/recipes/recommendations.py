@@ -0,0 +1,227 @@
+import heapq
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef
+
+from recipes.models import (Favorite, RecipeSimilarity, RecommendationsBuild,
+                            ShoppingCart)
+from users.models import Follow
+
+BATCH_SIZE = 1000
+# Сходство округляется, чтобы порядок равных рецептов не зависел от
+# порядка сложения при расчете на NumPy и на Python.
+SCORE_DIGITS = 12
+# Число рецептов в одном умножении разреженных матриц.
+CHUNK_SIZE = 2000
+
+
+def load_interactions():
+    """Тройки (пользователь, рецепт, вес) из избранного и корзин."""
+
+    interactions = []
+    for model, weight in (
+        (Favorite, 1.0),
+        (ShoppingCart, settings.RECOMMENDATIONS_CART_WEIGHT),
+    ):
+        interactions.extend(
+            (user_id, recipe_id, weight)
+            for user_id, recipe_id in model.objects.values_list(
+                'user_id', 'recipe_id'
+            ).iterator()
+        )
+    return interactions
+
+
+def compute_neighbours(interactions, recipe_ids, limit):
+    """Самые похожие рецепты для каждого из recipe_ids.
+
+    Сходство - косинус между векторами весов рецептов по пользователям.
+    Возвращает {id рецепта: [(сходство, id похожего рецепта), ...]} по
+    убыванию сходства. Считается на NumPy и SciPy, если они установлены.
+    """
+
+    try:
+        import numpy  # noqa: F401
+        from scipy import sparse  # noqa: F401
+    except ImportError:
+        return compute_neighbours_python(interactions, recipe_ids, limit)
+    return compute_neighbours_numpy(interactions, recipe_ids, limit)
+
+
+def compute_neighbours_python(interactions, recipe_ids, limit):
+    by_user = defaultdict(lambda: defaultdict(float))
+    by_recipe = defaultdict(lambda: defaultdict(float))
+    for user_id, recipe_id, weight in interactions:
+        by_user[user_id][recipe_id] += weight
+        by_recipe[recipe_id][user_id] += weight
+    norms = {
+        recipe_id: math.sqrt(sum(weight * weight for weight in users.values()))
+        for recipe_id, users in by_recipe.items()
+    }
+    neighbours = {}
+    for recipe_id in recipe_ids:
+        dots = defaultdict(float)
+        for user_id, weight in by_recipe.get(recipe_id, {}).items():
+            for other_id, other_weight in by_user[user_id].items():
+                dots[other_id] += weight * other_weight
+        dots.pop(recipe_id, None)
+        norm = norms.get(recipe_id)
+        neighbours[recipe_id] = heapq.nlargest(limit, (
+            (round(dot / (norm * norms[other_id]), SCORE_DIGITS), other_id)
+            for other_id, dot in dots.items()
+        ))
+    return neighbours
+
+
+def compute_neighbours_numpy(interactions, recipe_ids, limit):
+    import numpy as np
+    from scipy import sparse
+
+    neighbours = {recipe_id: [] for recipe_id in recipe_ids}
+    if not interactions:
+        return neighbours
+    users, recipes, weights = (np.array(column) for column in zip(
+        *interactions
+    ))
+    _, rows = np.unique(users, return_inverse=True)
+    recipe_keys, columns = np.unique(recipes, return_inverse=True)
+    # Повторяющиеся пары пользователь-рецепт складываются при сборке.
+    matrix = sparse.csr_matrix(
+        (weights, (rows, columns)), shape=(rows.max() + 1, len(recipe_keys))
+    )
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0))).ravel()
+    normalized = (matrix @ sparse.diags(1 / norms)).tocsc()
+    transposed = normalized.T.tocsr()
+    index = {
+        recipe_id: position
+        for position, recipe_id in enumerate(recipe_keys.tolist())
+    }
+    positions = np.array(
+        [index[recipe_id] for recipe_id in recipe_ids if recipe_id in index],
+        dtype=np.int64,
+    )
+    for start in range(0, len(positions), CHUNK_SIZE):
+        chunk = positions[start:start + CHUNK_SIZE]
+        similarity = (transposed[chunk] @ normalized).tocsr()
+        for row, position in enumerate(chunk):
+            bounds = slice(similarity.indptr[row], similarity.indptr[row + 1])
+            others = similarity.indices[bounds]
+            scores = similarity.data[bounds]
+            is_other = others != position
+            other_ids = recipe_keys[others[is_other]]
+            scores = np.round(scores[is_other], SCORE_DIGITS)
+            # Как heapq.nlargest: по убыванию сходства, затем id.
+            order = np.lexsort((-other_ids, -scores))[:limit]
+            neighbours[int(recipe_keys[position])] = list(zip(
+                scores[order].tolist(), other_ids[order].tolist()
+            ))
+    return neighbours
+
+
+def build_recommendations(incremental=False):
+    """Строит таблицу похожих рецептов RecipeSimilarity.
+
+    В инкрементальном режиме пересчитываются только рецепты из истории
+    пользователей, добавивших рецепты в избранное или корзину после
+    прошлого построения. Удаления из избранного и корзины, как и сходство
+    с остальными рецептами, уточняет полное построение.
+    """
+
+    last_build = RecommendationsBuild.objects.first()
+    incremental = incremental and last_build is not None
+    favorite_max_id = Favorite.objects.aggregate(Max('id'))['id__max'] or 0
+    cart_max_id = ShoppingCart.objects.aggregate(Max('id'))['id__max'] or 0
+    interactions = load_interactions()
+    if incremental:
+        user_ids = set(
+            Favorite.objects.filter(id__gt=last_build.favorite_max_id)
+            .values_list('user_id', flat=True)
+        ) | set(
+            ShoppingCart.objects.filter(id__gt=last_build.cart_max_id)
+            .values_list('user_id', flat=True)
+        )
+        recipe_ids = {
+            recipe_id for user_id, recipe_id, _ in interactions
+            if user_id in user_ids
+        }
+    else:
+        recipe_ids = {recipe_id for _, recipe_id, _ in interactions}
+    neighbours = compute_neighbours(
+        interactions, recipe_ids, settings.RECOMMENDATIONS_NEIGHBOURS
+    )
+    with transaction.atomic():
+        similarities = RecipeSimilarity.objects.all()
+        if incremental:
+            similarities = similarities.filter(recipe_id__in=recipe_ids)
+        similarities.delete()
+        RecipeSimilarity.objects.bulk_create(
+            (
+                RecipeSimilarity(
+                    recipe_id=recipe_id,
+                    similar_recipe_id=similar_id,
+                    score=score,
+                )
+                for recipe_id, similar in neighbours.items()
+                for score, similar_id in similar
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        return RecommendationsBuild.objects.create(
+            incremental=incremental,
+            favorite_max_id=favorite_max_id,
+            cart_max_id=cart_max_id,
+            recipes=len(recipe_ids),
+        )
+
+
+def recommend(user):
+    """id рецептов для пользователя по убыванию оценки.
+
+    Оценка рецепта - сумма его сходства с последними рецептами из
+    избранного и корзины пользователя с их весами, для авторов из подписок
+    увеличенная на RECOMMENDATIONS_FOLLOW_BOOST. Рецепты пользователя и
+    рецепты, уже добавленные в избранное или корзину, не предлагаются.
+    """
+
+    seeds = defaultdict(float)
+    for model, weight in (
+        (Favorite, 1.0),
+        (ShoppingCart, settings.RECOMMENDATIONS_CART_WEIGHT),
+    ):
+        for recipe_id in model.objects.filter(user=user).order_by(
+            '-id'
+        ).values_list('recipe_id', flat=True)[:settings.RECOMMENDATIONS_SEEDS]:
+            seeds[recipe_id] += weight
+    if not seeds:
+        return []
+    similarities = RecipeSimilarity.objects.filter(
+        recipe_id__in=seeds,
+    ).exclude(
+        similar_recipe__author=user,
+    ).exclude(
+        Exists(Favorite.objects.filter(
+            user=user, recipe_id=OuterRef('similar_recipe_id')
+        )),
+    ).exclude(
+        Exists(ShoppingCart.objects.filter(
+            user=user, recipe_id=OuterRef('similar_recipe_id')
+        )),
+    ).annotate(
+        followed=Exists(Follow.objects.filter(
+            user=user, following_id=OuterRef('similar_recipe__author_id')
+        )),
+    ).values_list('recipe_id', 'similar_recipe_id', 'score', 'followed')
+    scores = defaultdict(float)
+    for recipe_id, similar_id, score, followed in similarities:
+        if followed:
+            score *= 1 + settings.RECOMMENDATIONS_FOLLOW_BOOST
+        scores[similar_id] += seeds[recipe_id] * score
+    return [
+        recipe_id for _, recipe_id in sorted(
+            ((score, recipe_id) for recipe_id, score in scores.items()),
+            reverse=True,
+        )
+    ]
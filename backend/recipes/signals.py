@@ -0,0 +1,61 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from recipes.counters import change_counter, change_counters
+from recipes.images import renditions_are_stale, schedule_renditions
+from recipes.models import Favorite, Recipe, RecipeIngredient
+from users.models import User
+
+# Отправляется после массовой загрузки ингредиентов, которая не вызывает
+# post_save для каждой записи.
+ingredients_imported = Signal()
+
+# Отправляется после пакетного добавления рецептов в избранное или
+# корзину, которое тоже обходит сигналы моделей.
+recipes_bulk_changed = Signal()
+
+# Отправляется при любом изменении ингредиентов рецепта: пакетном, которое
+# не вызывает сигналы RecipeIngredient, и по сигналам отдельных строк.
+# Кэши, зависящие от ингредиентов рецепта, обновляются только по нему.
+recipe_ingredients_changed = Signal()
+
+
+@receiver(post_save, sender=Favorite)
+def increment_favorites_count(instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def decrement_favorites_count(instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(recipes_bulk_changed, sender=Favorite)
+def change_favorites_count(recipe_ids, delta, **kwargs):
+    change_counters(Recipe, recipe_ids, 'favorites_count', delta)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def send_recipe_ingredients_changed(instance, **kwargs):
+    recipe_ingredients_changed.send(
+        sender=Recipe, recipe_id=instance.recipe_id, created=False
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def update_image_renditions(instance, **kwargs):
+    if renditions_are_stale(instance):
+        schedule_renditions(instance)
@@ -0,0 +1,90 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+TOKEN_KEY = 'auth-token:{key}'
+
+
+class TokenCache:
+    """Снимки пользователей по ключу токена.
+
+    Первый уровень - ограниченный LRU в памяти процесса, второй -
+    необязательный общий кэш AUTH_TOKEN_CACHE_ALIAS. Записи обоих уровней
+    живут не дольше AUTH_TOKEN_CACHE_TIMEOUT секунд.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_shared_cache():
+        alias = settings.AUTH_TOKEN_CACHE_ALIAS
+        return caches[alias] if alias else None
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, user = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    return copy.copy(user)
+                del self._entries[key]
+        shared_cache = self.get_shared_cache()
+        if shared_cache is None:
+            return None
+        user = shared_cache.get(TOKEN_KEY.format(key=key))
+        if user is not None:
+            self.set_local(key, user)
+            return copy.copy(user)
+        return None
+
+    def set(self, key, user):
+        self.set_local(key, copy.copy(user))
+        shared_cache = self.get_shared_cache()
+        if shared_cache is not None:
+            shared_cache.set(
+                TOKEN_KEY.format(key=key),
+                user,
+                settings.AUTH_TOKEN_CACHE_TIMEOUT,
+            )
+
+    def set_local(self, key, user):
+        expires = time.monotonic() + settings.AUTH_TOKEN_CACHE_TIMEOUT
+        with self._lock:
+            self._entries[key] = (expires, user)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.AUTH_TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+        shared_cache = self.get_shared_cache()
+        if shared_cache is not None:
+            shared_cache.delete_many(
+                [TOKEN_KEY.format(key=key) for key in keys]
+            )
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену без запроса к базе на каждый запрос."""
+
+    def authenticate_credentials(self, key):
+        user = token_cache.get(key)
+        if user is not None:
+            return user, Token(key=key, user=user)
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user)
+        return user, token
@@ -1,10 +1,37 @@
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import UserManager as DjangoUserManager
 from django.db import models
 
 from .validators import validate_username
 
 
+class UserQuerySet(models.QuerySet):
+    """Набор запросов пользователей."""
+
+    def with_is_subscribed(self, user):
+        """Аннотирует подписан ли user на каждого пользователя выборки."""
+
+        if user.is_anonymous:
+            return self.annotate(
+                is_subscribed=models.Value(
+                    False, output_field=models.BooleanField()
+                )
+            )
+        return self.annotate(
+            is_subscribed=models.Exists(
+                Follow.objects.filter(
+                    user=user,
+                    following=models.OuterRef('pk'),
+                )
+            )
+        )
+
+
+class UserManager(DjangoUserManager.from_queryset(UserQuerySet)):
+    """Менеджер пользователей с доступом к методам UserQuerySet."""
+
+
 class User(AbstractUser):
     """Модель пользователя."""
 
@@ -27,6 +54,18 @@ class User(AbstractUser):
         verbose_name='Фамилия',
         max_length=settings.LAST_NAME_LEN,
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0,
+        editable=False,
+    )
+    objects = UserManager()
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = (
         'username',
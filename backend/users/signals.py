@@ -0,0 +1,33 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.counters import change_counter
+from users.authentication import token_cache
+from users.models import Follow, User
+
+
+@receiver(post_save, sender=Follow)
+def increment_followers_count(instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.following_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def decrement_followers_count(instance, **kwargs):
+    change_counter(User, instance.following_id, 'followers_count', -1)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(instance, **kwargs):
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(instance, created, **kwargs):
+    # Смена пароля или блокировка пользователя должны сразу отражаться
+    # в аутентификации, а не после истечения срока записи в кэше.
+    if not created:
+        token_cache.invalidate(
+            *Token.objects.filter(user=instance).values_list('key', flat=True)
+        )